@@ -1,16 +1,40 @@
 import os
-from flask import Flask, Response, render_template, send_file, request
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from gtts import gTTS
+
+# Redis call state and the message queue between workers need green sockets
+# under eventlet, patch before anything imports socket. Threads stay real OS
+# threads, so CPU-bound jobs on tts_pool don't run on (and freeze) the hub.
+if os.environ.get('SIGNALING_BACKEND', 'memory://').split(':', 1)[0] in ('redis', 'rediss', 'unix'):
+    try:
+        import eventlet
+        eventlet.monkey_patch(thread=False)
+    except ImportError:
+        pass
+
+from flask import Flask, Response, render_template, send_file, send_from_directory, request, jsonify
+from flask_socketio import SocketIO, emit
 import pyaudio
-import wave
-import io
 import threading
 import base64
 
+from signaling_backend import create_call_state, message_queue_for
+from tts_cache import TTSCache
+from tts_engines import get_engine
+from tts_workers import JobPool
+import audio_transcode
+from audio_transcode import transcode
+from tts_artifacts import ArtifactStore
+from recording_sessions import RecordingManager
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
-socketio = SocketIO(app, cors_allowed_origins="*")
+
+# Call state backend: memory:// keeps it in this process, redis://host:port/db
+# shares it (and relays emits) between several worker processes
+SIGNALING_BACKEND = os.environ.get('SIGNALING_BACKEND', 'memory://')
+PORT = int(os.environ.get('PORT', 5000))
+
+socketio = SocketIO(app, cors_allowed_origins="*",
+                    message_queue=message_queue_for(SIGNALING_BACKEND))
 
 # Audio recording configuration
 CHUNK = 1024
@@ -18,153 +42,340 @@ FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 44100
 RECORD_SECONDS = 5
-WAVE_OUTPUT_FILENAME = "static/output.wav"
+RECORDINGS_DIR = "static/recordings"
+# Start a new file every this many seconds of audio, 0 records one file
+RECORD_SEGMENT_SECONDS = int(os.environ.get('RECORD_SEGMENT_SECONDS', 0))
+# Let a fronting proxy send recording files: Flask sets X-Sendfile (Apache
+# mod_xsendfile, lighttpd), nginx would need X-Accel-Redirect instead
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+# Retention: finished recordings older than this, or past the size budget, are deleted
+RECORDING_MAX_AGE = int(os.environ.get('RECORDING_MAX_AGE', 24 * 3600))
+RECORDING_MAX_BYTES = int(os.environ.get('RECORDING_MAX_BYTES', 2 * 1024 ** 3))
 
-# Global variables for audio streaming
-is_recording = False
-audio_buffer = io.BytesIO()
 pyaudio_instance = pyaudio.PyAudio()
 
 # Call management
-active_calls = {}  # Dictionary to track active calls
-waiting_callers = {}  # Dictionary to track users waiting for calls
+# Active calls, indexed by room and by sid, and callers waiting for a peer
+call_registry, match_queue = create_call_state(SIGNALING_BACKEND)
+
+# Matchmaking: waiting callers are paired in batches once per tick
+MATCH_INTERVAL = 0.05  # seconds between matchmaking ticks
+MATCH_BATCH = 500  # maximum pairs per tick
+
+# Lifecycle: calls and waiting callers that outlive these are swept up, in
+# case a client went away without leave_call or disconnect reaching us
+SWEEP_INTERVAL = 30  # seconds between sweeps
+CALL_IDLE_TTL = 3600  # seconds without signaling before a call is dropped
+WAIT_TTL = 600  # seconds a caller may wait for a peer
+
+background_tasks_lock = threading.Lock()
+background_tasks_started = False
+
+# TTS engine (gtts, espeak or tone), set with the TTS_ENGINE environment variable
+tts_engine = get_engine()
 
+# TTS cache: repeated phrases are served from memory or disk instead of the engine
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', 'tts_cache')
+TTS_CACHE_MEMORY_BYTES = 64 * 1024 * 1024
+TTS_CACHE_DISK_BYTES = 1024 * 1024 * 1024
+tts_cache = TTSCache(TTS_CACHE_MEMORY_BYTES, TTS_CACHE_DIR, TTS_CACHE_DISK_BYTES)
 
-def record_audio():
-    global is_recording, audio_buffer
-    stream = pyaudio_instance.open(format=FORMAT,
+# Blocking TTS work runs on a bounded worker pool, off the Socket.IO event loop
+TTS_WORKERS = 4  # threads synthesizing at the same time
+TTS_MAX_PENDING = 32  # queued + running jobs before new requests are refused
+TTS_JOB_TIMEOUT = 30  # seconds before a job is reported as timed out
+tts_pool = JobPool(socketio, TTS_WORKERS, TTS_MAX_PENDING, TTS_JOB_TIMEOUT)
+# Non-wav engines (gtts) are decoded in-process by PyAV; without it every
+# request starts an ffmpeg process
+if audio_transcode.av is None:
+    print("PyAV is not installed, TTS audio is transcoded by one ffmpeg process per request (pip install av)")
+
+# Per-request audio files (bot injection audio), served from /artifacts/<name>
+artifact_store = ArtifactStore()
+
+
+def open_input_stream(device=None):
+    return pyaudio_instance.open(format=FORMAT,
                                  channels=CHANNELS,
                                  rate=RATE,
                                  input=True,
+                                 input_device_index=device,
                                  frames_per_buffer=CHUNK)
-    
-    audio_buffer = io.BytesIO()
-    is_recording = True
-    
-    while is_recording:
-        data = stream.read(CHUNK)
-        audio_buffer.write(data)
-    
-    stream.stop_stream()
-    stream.close()
+
+# Recordings, each with its own id, input device and files; any number can run at once
+recordings = RecordingManager(RECORDINGS_DIR, open_input_stream, CHANNELS,
+                              pyaudio_instance.get_sample_size(FORMAT), RATE, CHUNK,
+                              RECORD_SEGMENT_SECONDS or None, RECORDING_MAX_AGE, RECORDING_MAX_BYTES)
 
 @app.route('/download')
-def download():
+@app.route('/download/<recording_id>')
+def download(recording_id=None):
     try:
-        if os.path.exists(WAVE_OUTPUT_FILENAME):
+        # Without an id, the latest finished recording
+        session = recordings.get(recording_id) if recording_id else recordings.latest()
+        if session and session.active:
+            return "Recording still in progress", 409
+        # With segment rotation on, ?segment=N picks a segment
+        segment = request.args.get('segment', 0, type=int)
+        if session and 0 <= segment < len(session.segments) and os.path.exists(session.segments[segment]):
+            # Range requests for seeking, ETag / If-Modified-Since for
+            # repeat loads, and the file is sent by the server's sendfile
+            # support rather than read into memory
             return send_file(
-                WAVE_OUTPUT_FILENAME,
-                mimetype='audio/wav'
+                session.segments[segment],
+                mimetype='audio/wav',
+                conditional=True,
+                etag=True
             )
         else:
             return "No recording found", 404
     except Exception as e:
         return str(e), 500
 
-def save_audio():
-    global audio_buffer
-    audio_buffer.seek(0)
-    
-    os.makedirs(os.path.dirname(WAVE_OUTPUT_FILENAME), exist_ok=True)
-    
-    with wave.open(WAVE_OUTPUT_FILENAME, 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(pyaudio_instance.get_sample_size(FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(audio_buffer.getvalue())
+def announce_recording(session):
+    if not session.segments:
+        return
     
-    # After saving, broadcast the audio to all clients
-    with open(WAVE_OUTPUT_FILENAME, 'rb') as f:
-        audio_data = f.read()
-        socketio.emit('recorded_audio', {'audio': audio_data})
+    # Tell all clients where the recording is, they fetch it if and when they play it
+    socketio.emit('recorded_audio', {
+        'recording_id': session.id,
+        'url': f"/download/{session.id}",
+        'segments': len(session.segments),
+        'duration': session.frames / RATE
+    })
+
+@app.before_request
+def ensure_background_tasks():
+    # The sweeper also enforces artifact and recording retention, so it has
+    # to run on servers that only record or serve TTS and never see a
+    # join_call. Started from a request rather than at import, so it runs on
+    # the serving event loop (the debug reloader serves from another thread).
+    start_background_tasks()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/artifacts/<name>')
+def artifact(name):
+    return send_from_directory(artifact_store.root, name)
+
+@app.route('/stats')
+def stats():
+    return jsonify({
+        'active_calls': len(call_registry),
+        'indexed_sids': call_registry.sid_count(),
+        'waiting_callers': len(match_queue),
+        'tts_cache': tts_cache.stats(),
+        'tts_jobs': tts_pool.stats(),
+        'active_recordings': sum(1 for info in recordings.list() if info['active']),
+    })
+
+@app.route('/recordings')
+def list_recordings():
+    return jsonify(recordings.list())
+
 @app.route('/start_recording')
 def start_recording():
-    global is_recording
-    if not is_recording:
-        recording_thread = threading.Thread(target=record_audio)
-        recording_thread.start()
-    return "Recording started"
+    # ?device=N picks a PyAudio input device, ?label= tags the recording (e.g. a call room)
+    recordings.sweep()
+    try:
+        session = recordings.start(request.args.get('device', type=int), request.args.get('label'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'recording_id': session.id, 'message': "Recording started"})
 
 @app.route('/stop_recording')
-def stop_recording():
-    global is_recording
-    is_recording = False
-    save_audio()
-    return "Recording stopped and saved"
+@app.route('/stop_recording/<recording_id>')
+def stop_recording(recording_id=None):
+    if recording_id is None:
+        # Without an id, the most recently started recording that is still running
+        active = [info for info in recordings.list() if info['active']]
+        if not active:
+            return jsonify({'error': "No recording in progress"}), 404
+        recording_id = active[-1]['id']
+    
+    session = recordings.stop(recording_id)
+    if session is None:
+        return jsonify({'error': "No such recording"}), 404
+    announce_recording(session)
+    return jsonify({'recording_id': session.id, 'message': "Recording stopped and saved"})
+
+def synthesize_wav(text):
+    audio = tts_engine.synthesize(text, lang='en')
+    if tts_engine.format == 'wav':
+        return audio
+    
+    # Decode in memory, no temporary files or ffmpeg shell-out
+    return transcode(audio, 'wav')
 
 @socketio.on('text_message')
 def handle_text_message(data):
-    try:
-        text = data.get('text', '')
-        if not text:
-            emit('error', {'message': 'No text provided for TTS'})
-            return
-        
-        tts = gTTS(text=text, lang='en')
-        output_file = 'static/speech.mp3'
-        tts.save(output_file)
-        
-        wav_file = 'static/speech.wav'
-        os.system(f'ffmpeg -i {output_file} -y {wav_file}')
-        
-        with open(wav_file, 'rb') as f:
-            audio_data = f.read()
-            emit('audio_message', {'audio': audio_data}, broadcast=True)
-    except Exception as e:
+    """
+    Synthesize text and send the audio to every client as audio_message, with
+    the text and the request_id it was asked with. private: true sends it to
+    the requesting client only.
+    """
+    text = data.get('text', '')
+    # Echoed back so concurrent requesters can tell their audio apart
+    request_id = data.get('request_id')
+    private = bool(data.get('private'))
+    if not text:
+        emit('error', {'message': 'No text provided for TTS'})
+        return
+    
+    # Cache hits are cheap enough to answer right here
+    audio_data = tts_cache.get(text, 'en', tts_engine.name, 'wav')
+    if audio_data is not None:
+        emit('audio_message', {'audio': audio_data, 'text': text, 'request_id': request_id}, broadcast=not private)
+        return
+    
+    sid = request.sid
+    
+    def on_done(audio_data):
+        tts_cache.put(text, 'en', tts_engine.name, 'wav', audio_data)
+        socketio.emit('audio_message', {'audio': audio_data, 'text': text, 'request_id': request_id},
+                      room=sid if private else None)
+    
+    def on_error(e):
         print(f"Error in TTS: {e}")
-        emit('error', {'message': str(e)})
+        socketio.emit('error', {'message': str(e), 'request_id': request_id}, room=sid)
+    
+    job_id = tts_pool.submit(synthesize_wav, text, sid=sid,
+                             on_done=on_done, on_error=on_error, event='tts_job_done')
+    if job_id is None:
+        emit('error', {'message': 'TTS is busy, try again shortly', 'request_id': request_id})
+    else:
+        emit('tts_job_queued', {'job_id': job_id, 'request_id': request_id})
+
+@socketio.on('inject_tts')
+def handle_inject_tts(data):
+    """
+    Speak text into a live call: the audio is pushed to a caller running the
+    injected microphone (audio_reinject.js), which queues it on its outgoing
+    track without renegotiating. target is 'self' (default) or 'peer'.
+    """
+    text = data.get('text', '')
+    request_id = data.get('request_id')
+    interrupt = bool(data.get('interrupt'))
+    if not text:
+        emit('error', {'message': 'No text provided for TTS', 'request_id': request_id})
+        return
+
+    sid = request.sid
+    target = call_registry.peer_of(sid) if data.get('target') == 'peer' else sid
+    if target is None:
+        emit('error', {'message': 'Not in a call', 'request_id': request_id})
+        return
+
+    def inject(audio_data):
+        socketio.emit('inject_audio', {'audio': audio_data, 'text': text, 'request_id': request_id,
+                                       'interrupt': interrupt}, room=target)
+
+    audio_data = tts_cache.get(text, 'en', tts_engine.name, 'wav')
+    if audio_data is not None:
+        inject(audio_data)
+        return
+
+    def on_done(audio_data):
+        tts_cache.put(text, 'en', tts_engine.name, 'wav', audio_data)
+        inject(audio_data)
+
+    def on_error(e):
+        print(f"Error in TTS: {e}")
+        socketio.emit('error', {'message': str(e), 'request_id': request_id}, room=sid)
+
+    job_id = tts_pool.submit(synthesize_wav, text, sid=sid,
+                             on_done=on_done, on_error=on_error, event='tts_job_done')
+    if job_id is None:
+        emit('error', {'message': 'TTS is busy, try again shortly', 'request_id': request_id})
+    else:
+        emit('tts_job_queued', {'job_id': job_id, 'request_id': request_id})
 
 # New WebRTC signaling routes
 @socketio.on('join_call')
 def handle_join_call(data=None):
+    data = data or {}
     caller_id = request.sid
-    
-    # If no active calls, create waiting room
-    if not waiting_callers:
-        waiting_callers[caller_id] = True
+
+    # Ignore repeated joins from a caller that is already in a call
+    if call_registry.room_of(caller_id):
+        return
+
+    start_background_tasks()
+
+    # Optional constraints: what this caller is, what it must be paired
+    # with and a scenario tag that only matches the same tag
+    if match_queue.enqueue(caller_id,
+                           role=data.get('role'),
+                           peer_role=data.get('peer_role'),
+                           scenario=data.get('scenario')):
         emit('waiting_for_peer', {'caller_id': caller_id})
-    else:
-        # Match with waiting caller
-        waiting_caller = next(iter(waiting_callers))
-        room = f"call_{waiting_caller}_{caller_id}"
-        
-        active_calls[room] = {
-            'caller1': waiting_caller, 
-            'caller2': caller_id
-        }
-        
-        # Join room and notify participants
-        join_room(room)
-        emit('call_connected', {'room': room, 'is_initiator': True}, room=waiting_caller)
-        emit('call_connected', {'room': room, 'is_initiator': False}, room=caller_id)
-        
-        # Remove from waiting list
-        waiting_callers.pop(waiting_caller, None)
 
-@socketio.on('leave_call')
-def handle_leave_call(data=None):  # Make data parameter optional
-    caller_id = request.sid
-    room = None
+def start_background_tasks():
+    global background_tasks_started
+    with background_tasks_lock:
+        if not background_tasks_started:
+            background_tasks_started = True
+            socketio.start_background_task(run_matchmaker)
+            socketio.start_background_task(run_sweeper)
+
+def run_matchmaker():
+    while True:
+        pairs = match_queue.drain(MATCH_BATCH)
+        for first, second in pairs:
+            connect_callers(first.sid, second.sid)
+
+        # Keep draining without sleeping while a burst is being worked off
+        if len(pairs) < MATCH_BATCH:
+            socketio.sleep(MATCH_INTERVAL)
+
+def run_sweeper():
+    while True:
+        socketio.sleep(SWEEP_INTERVAL)
+
+        for _, participants in call_registry.expire_idle(CALL_IDLE_TTL):
+            for caller_id in (participants['caller1'], participants['caller2']):
+                socketio.emit('peer_left', {'caller_id': None, 'reason': 'idle_timeout'}, room=caller_id)
+
+        for caller in match_queue.expire(WAIT_TTL):
+            socketio.emit('join_timeout', {'caller_id': caller.sid}, room=caller.sid)
+
+        artifact_store.sweep()
+        recordings.sweep()
+
+def connect_callers(waiting_caller, caller_id):
+    room = f"call_{waiting_caller}_{caller_id}"
     
-    # Find the room this user is in
-    for r, participants in active_calls.items():
-        if caller_id in [participants['caller1'], participants['caller2']]:
-            room = r
-            break
+    call_registry.add_call(room, waiting_caller, caller_id)
+    
+    # Notify participants. Call traffic is always addressed to sids rather
+    # than Socket.IO rooms, since room membership is local to one worker.
+    socketio.emit('call_connected', {'room': room, 'is_initiator': True}, room=waiting_caller)
+    socketio.emit('call_connected', {'room': room, 'is_initiator': False}, room=caller_id)
+
+def end_call(caller_id):
+    room, participants = call_registry.remove_sid(caller_id)
     
     if room:
         # Notify other participant
-        emit('peer_left', {'caller_id': caller_id}, room=room)
-        leave_room(room)
-        active_calls.pop(room, None)
+        other_participant = (
+            participants['caller2']
+            if participants['caller1'] == caller_id
+            else participants['caller1']
+        )
+        emit('peer_left', {'caller_id': caller_id}, room=other_participant)
     else:
         # Remove from waiting list if they were waiting
-        waiting_callers.pop(caller_id, None)
+        match_queue.remove(caller_id)
+
+@socketio.on('leave_call')
+def handle_leave_call(data=None):  # Make data parameter optional
+    end_call(request.sid)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    end_call(request.sid)
 
 @socketio.on('webrtc_signal')
 def handle_webrtc_signal(data):
@@ -174,21 +385,11 @@ def handle_webrtc_signal(data):
     signal = data['signal']
     caller_id = request.sid
     
-    # Find the room this caller is in
-    room = None
-    for r, participants in active_calls.items():
-        if caller_id in [participants['caller1'], participants['caller2']]:
-            room = r
-            break
+    # Send signal only to the other participant in the room
+    other_participant = call_registry.peer_of(caller_id)
     
-    if room:
-        # Send signal only to the other participant in the room
-        other_participant = (
-            active_calls[room]['caller2'] 
-            if active_calls[room]['caller1'] == caller_id 
-            else active_calls[room]['caller1']
-        )
-        
+    if other_participant:
+        call_registry.touch(caller_id)
         emit('webrtc_signal', {
             'signal': signal,
             'caller_id': caller_id
@@ -200,4 +401,4 @@ if __name__ == '__main__':
     os.makedirs('static', exist_ok=True)
     
     
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    socketio.run(app, debug=True, host='0.0.0.0', port=PORT)
\ No newline at end of file
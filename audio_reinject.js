@@ -1,50 +1,201 @@
-// Save the original getUserMedia method
-const originalGetUserMedia = navigator.mediaDevices.getUserMedia;
+// Arguments: URL of the audio to inject, or a list of URLs played back to
+// back as a playlist, and whether to loop it. Once the call is up, more
+// audio can be queued from the server (inject_tts) or the page
+// (window.__robocallAudio.say), see the mixer below.
+const audioUrls = [].concat(arguments[0]);
+const loopAudio = arguments[1];
 
-// Override getUserMedia
-navigator.mediaDevices.getUserMedia = async (constraints) => {
-    // Call the original getUserMedia method
-    const stream = await originalGetUserMedia.call(navigator.mediaDevices, constraints);
+// Encoded audio is kept in the Cache API, which every tab of the browser
+// shares and which outlives the page, so each asset is downloaded once per
+// browser rather than once per call. It is only there on secure origins:
+// BrowserPool starts Chrome with the server's http:// origin treated as
+// secure. This many assets are kept, oldest dropped first.
+const AUDIO_CACHE_NAME = 'robocall-audio';
+const AUDIO_CACHE_SIZE = 32;
+
+// Per page state: one AudioContext for all calls made from the page, and the
+// assets it has decoded. Survives the script being injected again, but not
+// the page: BrowserPool loads about:blank between calls, so each call still
+// decodes its audio once and creates its own AudioContext.
+const injection = window.__robocallAudio = window.__robocallAudio || {
+    context: null,
+    buffers: new Map(),
+};
+
+function audioContext() {
+    if (!injection.context || injection.context.state === 'closed') {
+        injection.context = new AudioContext();
+    }
+    return injection.context;
+}
 
-    // Create an audio context
-    const audioContext = new AudioContext();
+async function fetchAudio(url, timings) {
+    // Cache Storage is only there in secure contexts (https, localhost or an
+    // origin Chrome is told to treat as secure)
+    if (!window.caches) {
+        if (!injection.warnedNoCache) {
+            injection.warnedNoCache = true;
+            console.warn('No Cache Storage on ' + location.origin + ', audio is downloaded for every call');
+        }
+        return (await fetch(url)).arrayBuffer();
+    }
 
-    console.log("fetching audio file: ", arguments[0]);
+    const cache = await caches.open(AUDIO_CACHE_NAME);
+    let response = await cache.match(url);
+    if (response) {
+        timings.cacheHits++;
+    } else {
+        response = await fetch(url);
+        if (response.ok) {
+            await cache.put(url, response.clone());
+            const keys = await cache.keys();
+            await Promise.all(keys.slice(0, Math.max(0, keys.length - AUDIO_CACHE_SIZE)).map((key) => cache.delete(key)));
+        }
+    }
+    return response.arrayBuffer();
+}
 
-    // Fetch and decode the audio file
-    const audioFile = await fetch(arguments[0]);
-    const arrayBuffer = await audioFile.arrayBuffer();
-    const audioBuffer = await audioContext.decodeAudioData(arrayBuffer);
+async function loadAudio(url, timings) {
+    if (!injection.buffers.has(url)) {
+        // Store the promise, so concurrent loads of one asset decode it once
+        injection.buffers.set(url, (async () => {
+            let start = performance.now();
+            const arrayBuffer = await fetchAudio(url, timings);
+            timings.fetchMs += performance.now() - start;
 
-    // Create a source and set it up to play the audio buffer
-    const source = audioContext.createBufferSource();
-    source.buffer = audioBuffer;
-    source.loop = true;
-    // source.connect(audioContext.destination);
-    // source.start(0);
+            start = performance.now();
+            const audioBuffer = await audioContext().decodeAudioData(arrayBuffer);
+            timings.decodeMs += performance.now() - start;
+            return audioBuffer;
+        })());
+        injection.buffers.get(url).catch(() => injection.buffers.delete(url));
+    }
+    return injection.buffers.get(url);
+}
 
-    const mediaStreamDestination = audioContext.createMediaStreamDestination();
+// The injected microphone: buffers queued on a gain node that feeds the
+// outgoing track. New audio can be queued while the call is live, the
+// track and so the SDP stay the same.
+function createMixer(context) {
+    const mixer = {
+        gain: context.createGain(),
+        destination: context.createMediaStreamDestination(),
+        sources: [],
+        nextTime: 0,
+    };
+    mixer.gain.connect(mixer.destination);
+    return mixer;
+}
 
-    // Create a MediaStreamDestination node
-    // Connect the source to the MediaStreamDestination
-    source.connect(mediaStreamDestination);
-    source.start(0); // Start playing the audio file
+// Play buffer after everything already queued
+function enqueue(mixer, buffer) {
+    const context = mixer.gain.context;
+    const source = context.createBufferSource();
+    source.buffer = buffer;
+    source.connect(mixer.gain);
 
-    // Replace the original audio track with the one from the MediaStreamDestination
-    const audioTrack = mediaStreamDestination.stream.getAudioTracks()[0];
+    mixer.nextTime = Math.max(mixer.nextTime, context.currentTime);
+    source.start(mixer.nextTime);
+    mixer.nextTime += buffer.duration;
+    mixer.sources.push(source);
 
-    // Create a new MediaStream with the injected audio track
-    const injectedStream = new MediaStream([audioTrack]);
+    source.onended = () => {
+        const index = mixer.sources.indexOf(source);
+        if (index === -1) {
+            return;  // cut off by interrupt()
+        }
+        mixer.sources.splice(index, 1);
+        if (mixer.sources.length === 0) {
+            onIdle(mixer);
+        }
+    };
+}
 
-    // Return the new stream to mimic microphone input
-    return injectedStream;
+// Drop whatever is playing or queued
+function interrupt(mixer) {
+    const sources = mixer.sources;
+    mixer.sources = [];
+    mixer.nextTime = 0;
+    sources.forEach((source) => source.stop());
+}
+
+function onIdle(mixer) {
+    if (loopAudio) {
+        mixer.playlist.forEach((buffer) => enqueue(mixer, buffer));
+    } else {
+        // Let the harness know when the queued audio has been played
+        window.dispatchEvent(new CustomEvent('robocall:playback_ended'));
+    }
+}
+
+// Fade the injected microphone to value (1 is unchanged, 0 is silent)
+injection.setGain = (value, seconds = 0.05) => {
+    if (injection.mixer) {
+        injection.mixer.gain.gain.setTargetAtTime(value, injection.mixer.gain.context.currentTime, seconds / 3);
+    }
 };
 
+// Ask the server to speak text on the live call, from this page's
+// microphone (target 'self') or the other side's ('peer')
+injection.say = (text, options = {}) => {
+    socket.emit('inject_tts', Object.assign({ text: text }, options));
+};
+
+// Audio pushed by the server's inject_tts, played on the live call in the
+// order it arrives. Registered once per page.
+if (typeof socket !== 'undefined' && !injection.listening) {
+    injection.listening = true;
+    injection.pending = Promise.resolve();
+    socket.on('inject_audio', (data) => {
+        injection.pending = injection.pending.then(async () => {
+            const buffer = await audioContext().decodeAudioData(data.audio.slice(0));
+            if (!injection.mixer) {
+                return;
+            }
+            if (data.interrupt) {
+                interrupt(injection.mixer);
+            }
+            enqueue(injection.mixer, buffer);
+        }).catch((err) => console.error('Error injecting audio:', err));
+    });
+}
+
+// Override getUserMedia
+navigator.mediaDevices.getUserMedia = async (constraints) => {
+    const setupStart = performance.now();
+    const timings = { fetchMs: 0, decodeMs: 0, cacheHits: 0 };
+
+    // Fetch and decode the playlist, reusing anything this page already decoded
+    console.log("loading audio files: ", audioUrls);
+    const context = audioContext();
+    const buffers = await Promise.all(audioUrls.map((url) => loadAudio(url, timings)));
+    if (context.state === 'suspended') {
+        await context.resume();
+    }
+
+    const mixer = injection.mixer = createMixer(context);
+    mixer.playlist = buffers;
+
+    // Start playing once the other side is on the line, not while waiting for a peer
+    const start = () => buffers.forEach((buffer) => enqueue(mixer, buffer));
+    if (typeof socket !== 'undefined') {
+        socket.once('call_connected', start);
+    } else {
+        start();
+    }
+
+    // How long it took to set up the injected microphone, read by the harness
+    window.__audioInjection = Object.assign({ setupMs: performance.now() - setupStart, segments: buffers.length }, timings);
+
+    // Return a new stream with only the injected audio track, to mimic microphone input.
+    // The real microphone isn't needed at all.
+    return new MediaStream(mixer.destination.stream.getAudioTracks());
+};
 
 
 // async function startCall_inject() {
 //     try {
-        
+
 //         localStream = await navigator.mediaDevices.getUserMedia({ audio: true });
 //         startCallButton.disabled = true;
 //         callStatus.textContent = 'Status: Waiting for peer...';
@@ -55,4 +206,4 @@ navigator.mediaDevices.getUserMedia = async (constraints) => {
 //         console.error('Error accessing microphone:', err);
 //         callStatus.textContent = 'Error accessing microphone';
 //     }
-// }
\ No newline at end of file
+// }
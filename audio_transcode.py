@@ -0,0 +1,97 @@
+"""
+In-memory audio transcoding: encoded bytes in, PCM or wav bytes out.
+
+Uses PyAV (libav* in-process) when it is installed. Without it, falls back
+to one ffmpeg process per request that reads from stdin and writes to
+stdout, which still avoids the temporary files and the shell.
+"""
+import io
+import subprocess
+import wave
+
+from tts_engines import fix_wav_sizes
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# Packed sample formats supported in the output, with their sample widths
+SAMPLE_WIDTHS = {'u8': 1, 's16': 2, 's32': 4, 'flt': 4}
+FFMPEG_RAW_FORMATS = {'u8': 'u8', 's16': 's16le', 's32': 's32le', 'flt': 'f32le'}
+FFMPEG_WAV_CODECS = {'u8': 'pcm_u8', 's16': 'pcm_s16le', 's32': 'pcm_s32le'}
+
+
+def transcode(data, fmt='wav', rate=None, channels=None, sample_fmt='s16'):
+    """
+    Decode audio bytes in any container/codec ffmpeg knows.
+
+    fmt is 'wav' or 'pcm' (raw interleaved samples). rate and channels
+    default to those of the input. wav output only supports integer sample
+    formats, since that is all the wave module writes.
+    """
+    if fmt not in ('wav', 'pcm'):
+        raise ValueError(f"Unsupported output format: {fmt}")
+    if sample_fmt not in SAMPLE_WIDTHS:
+        raise ValueError(f"Unsupported sample format: {sample_fmt}")
+    if fmt == 'wav' and sample_fmt not in FFMPEG_WAV_CODECS:
+        raise ValueError(f"wav output does not support sample format {sample_fmt}")
+
+    if av is not None:
+        return _transcode_av(data, fmt, rate, channels, sample_fmt)
+    return _transcode_ffmpeg(data, fmt, rate, channels, sample_fmt)
+
+
+def _transcode_av(data, fmt, rate, channels, sample_fmt):
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.audio[0]
+        rate = rate or stream.codec_context.sample_rate
+        channels = channels or len(stream.codec_context.layout.channels)
+        layout = 'mono' if channels == 1 else 'stereo' if channels == 2 else f"{channels}c"
+
+        resampler = av.AudioResampler(format=sample_fmt, layout=layout, rate=rate)
+        frame_bytes = SAMPLE_WIDTHS[sample_fmt] * channels
+        pcm = bytearray()
+
+        def append(frames):
+            for frame in frames:
+                # Packed formats have a single, possibly padded, plane
+                pcm.extend(bytes(frame.planes[0])[:frame.samples * frame_bytes])
+
+        for frame in container.decode(stream):
+            append(resampler.resample(frame))
+        append(resampler.resample(None))
+
+    if fmt == 'pcm':
+        return bytes(pcm)
+    return pcm_to_wav(pcm, rate, channels, SAMPLE_WIDTHS[sample_fmt])
+
+
+def _transcode_ffmpeg(data, fmt, rate, channels, sample_fmt):
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0']
+    if rate:
+        command += ['-ar', str(rate)]
+    if channels:
+        command += ['-ac', str(channels)]
+
+    if fmt == 'pcm':
+        command += ['-f', FFMPEG_RAW_FORMATS[sample_fmt], 'pipe:1']
+    else:
+        command += ['-c:a', FFMPEG_WAV_CODECS[sample_fmt], '-f', 'wav', 'pipe:1']
+
+    result = subprocess.run(command, input=data, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, check=True)
+
+    if fmt == 'pcm':
+        return result.stdout
+    return fix_wav_sizes(result.stdout)
+
+
+def pcm_to_wav(pcm, rate, channels, sample_width=2):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(rate)
+        wf.writeframes(pcm)
+    return buffer.getvalue()
@@ -1,74 +1,160 @@
 import os
-from flask import Flask, render_template, request
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from gtts import gTTS
-import io
+import sys
+from flask import Flask, render_template, request, jsonify
+from flask_socketio import SocketIO, emit
+import threading
+import time
+import uuid
+
+# The call, TTS and recording modules are shared with the root server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from call_registry import CallRegistry
+from matchmaking import MatchQueue
+from tts_cache import TTSCache
+from tts_engines import get_engine
+from tts_workers import JobPool
+from tts_streaming import split_sentences, synthesize_stream
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
 # State management
-waiting_callers = {}
-active_calls = {}
+match_queue = MatchQueue()
+call_registry = CallRegistry()
+
+# Matchmaking: waiting callers are paired in batches once per tick
+MATCH_INTERVAL = 0.05  # seconds between matchmaking ticks
+MATCH_BATCH = 500  # maximum pairs per tick
+
+# Lifecycle: calls and waiting callers that outlive these are swept up, in
+# case a client went away without leave_call or disconnect reaching us
+SWEEP_INTERVAL = 30  # seconds between sweeps
+CALL_IDLE_TTL = 3600  # seconds without signaling before a call is dropped
+WAIT_TTL = 600  # seconds a caller may wait for a peer
+
+background_tasks_lock = threading.Lock()
+background_tasks_started = False
+
+# TTS engine (gtts, espeak or tone), set with the TTS_ENGINE environment variable
+tts_engine = get_engine()
+
+# TTS cache: repeated phrases are served from memory or disk instead of the engine
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', 'tts_cache')
+TTS_CACHE_MEMORY_BYTES = 64 * 1024 * 1024
+TTS_CACHE_DISK_BYTES = 1024 * 1024 * 1024
+tts_cache = TTSCache(TTS_CACHE_MEMORY_BYTES, TTS_CACHE_DIR, TTS_CACHE_DISK_BYTES)
+
+# Blocking TTS work runs on a bounded worker pool, off the Socket.IO event loop
+TTS_WORKERS = 4  # threads synthesizing at the same time
+TTS_MAX_PENDING = 32  # queued + running jobs before new requests are refused
+TTS_JOB_TIMEOUT = 30  # seconds before a job is reported as timed out
+tts_pool = JobPool(socketio, TTS_WORKERS, TTS_MAX_PENDING, TTS_JOB_TIMEOUT)
+
+# Streaming TTS: long texts are split into sentences and sent as sequenced
+# chunks while the next sentences are still being synthesized on tts_pool
+TTS_STREAM_PREFETCH = 2  # sentences synthesized ahead of the one being sent
+tts_stream_stats = {'streams': 0, 'last_time_to_first_audio_ms': None}
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/stats')
+def stats():
+    return jsonify({
+        'active_calls': len(call_registry),
+        'indexed_sids': call_registry.sid_count(),
+        'waiting_callers': len(match_queue),
+        'tts_cache': tts_cache.stats(),
+        'tts_jobs': tts_pool.stats(),
+        'tts_streaming': tts_stream_stats,
+    })
+
 @socketio.on('join_call')
 def handle_join_call(data=None):
+    data = data or {}
     caller_id = request.sid
-    
-    # If no active calls, create waiting room
-    if not waiting_callers:
-        waiting_callers[caller_id] = True
+
+    # Ignore repeated joins from a caller that is already in a call
+    if call_registry.room_of(caller_id):
+        return
+
+    start_background_tasks()
+
+    # Optional constraints: what this caller is, what it must be paired
+    # with and a scenario tag that only matches the same tag
+    if match_queue.enqueue(caller_id,
+                           role=data.get('role'),
+                           peer_role=data.get('peer_role'),
+                           scenario=data.get('scenario')):
         emit('waiting_for_peer', {'caller_id': caller_id})
-    else:
-        # Match with waiting caller
-        waiting_caller = next(iter(waiting_callers))
-        room = f"call_{waiting_caller}_{caller_id}"
-        
-        active_calls[room] = {
-            'caller1': waiting_caller,
-            'caller2': caller_id,
-            'muted_users': set()
-        }
-        
-        # Join room and notify participants
-        join_room(room)
-        emit('call_connected', {
-            'room': room, 
-            'is_initiator': True
-        }, room=waiting_caller)
-        
-        emit('call_connected', {
-            'room': room, 
-            'is_initiator': False
-        }, room=caller_id)
-        
-        # Remove from waiting list
-        waiting_callers.pop(waiting_caller, None)
 
-@socketio.on('leave_call')
-def handle_leave_call(data=None):
-    caller_id = request.sid
-    room = None
+def start_background_tasks():
+    global background_tasks_started
+    with background_tasks_lock:
+        if not background_tasks_started:
+            background_tasks_started = True
+            socketio.start_background_task(run_matchmaker)
+            socketio.start_background_task(run_sweeper)
+
+def run_matchmaker():
+    while True:
+        pairs = match_queue.drain(MATCH_BATCH)
+        for first, second in pairs:
+            connect_callers(first.sid, second.sid)
+
+        # Keep draining without sleeping while a burst is being worked off
+        if len(pairs) < MATCH_BATCH:
+            socketio.sleep(MATCH_INTERVAL)
+
+def run_sweeper():
+    while True:
+        socketio.sleep(SWEEP_INTERVAL)
+
+        for room, participants in call_registry.expire_idle(CALL_IDLE_TTL):
+            for caller_id in (participants['caller1'], participants['caller2']):
+                socketio.emit('peer_left', {'caller_id': None, 'reason': 'idle_timeout'}, room=caller_id)
+            socketio.close_room(room)
+
+        for caller in match_queue.expire(WAIT_TTL):
+            socketio.emit('join_timeout', {'caller_id': caller.sid}, room=caller.sid)
+
+def connect_callers(waiting_caller, caller_id):
+    room = f"call_{waiting_caller}_{caller_id}"
+    
+    call_registry.add_call(room, waiting_caller, caller_id, muted_users=set())
     
-    # Find the room this user is in
-    for r, participants in active_calls.items():
-        if caller_id in [participants['caller1'], participants['caller2']]:
-            room = r
-            break
+    # Join room and notify participants
+    socketio.server.enter_room(waiting_caller, room, namespace='/')
+    socketio.server.enter_room(caller_id, room, namespace='/')
+    socketio.emit('call_connected', {'room': room, 'is_initiator': True}, room=waiting_caller)
+    socketio.emit('call_connected', {'room': room, 'is_initiator': False}, room=caller_id)
+
+def end_call(caller_id):
+    room, participants = call_registry.remove_sid(caller_id)
     
     if room:
         # Notify other participant
-        emit('peer_left', {'caller_id': caller_id}, room=room)
-        leave_room(room)
-        active_calls.pop(room, None)
+        other_participant = (
+            participants['caller2']
+            if participants['caller1'] == caller_id
+            else participants['caller1']
+        )
+        emit('peer_left', {'caller_id': caller_id}, room=other_participant)
+        socketio.close_room(room)
     else:
         # Remove from waiting list if they were waiting
-        waiting_callers.pop(caller_id, None)
+        match_queue.remove(caller_id)
+
+@socketio.on('leave_call')
+def handle_leave_call(data=None):
+    end_call(request.sid)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    end_call(request.sid)
 
 @socketio.on('webrtc_signal')
 def handle_webrtc_signal(data):
@@ -78,21 +164,11 @@ def handle_webrtc_signal(data):
     signal = data['signal']
     caller_id = request.sid
     
-    # Find the room this caller is in
-    room = None
-    for r, participants in active_calls.items():
-        if caller_id in [participants['caller1'], participants['caller2']]:
-            room = r
-            break
+    # Send signal only to the other participant in the room
+    other_participant = call_registry.peer_of(caller_id)
     
-    if room:
-        # Send signal only to the other participant in the room
-        other_participant = (
-            active_calls[room]['caller2'] 
-            if active_calls[room]['caller1'] == caller_id 
-            else active_calls[room]['caller1']
-        )
-        
+    if other_participant:
+        call_registry.touch(caller_id)
         emit('webrtc_signal', {
             'signal': signal,
             'caller_id': caller_id
@@ -103,16 +179,62 @@ def handle_mute(data):
     room = data.get('room')
     caller_id = request.sid
     
-    if room in active_calls:
-        if caller_id in active_calls[room]['muted_users']:
-            active_calls[room]['muted_users'].remove(caller_id)
+    participants = call_registry.get(room)
+    
+    if participants:
+        if caller_id in participants['muted_users']:
+            participants['muted_users'].remove(caller_id)
         else:
-            active_calls[room]['muted_users'].add(caller_id)
+            participants['muted_users'].add(caller_id)
         
         emit('mute_status', {
-            'muted_users': list(active_calls[room]['muted_users'])
+            'muted_users': list(participants['muted_users'])
         }, room=room)
 
+def synthesize_cached(text):
+    return tts_cache.get_or_synthesize(
+        text, 'en', tts_engine.name, tts_engine.format,
+        lambda: tts_engine.synthesize(text, lang='en')
+    )
+
+def stream_tts(text, room):
+    stream_id = uuid.uuid4().hex
+    sentences = split_sentences(text)
+    started = time.perf_counter()
+    time_to_first_audio = None
+
+    try:
+        # Every sentence takes a tts_pool slot and gets the same timeout as a single job
+        for seq, sentence, audio in synthesize_stream(
+                sentences, synthesize_cached, tts_pool.try_submit,
+                prefetch=TTS_STREAM_PREFETCH, sleep=socketio.sleep, timeout=TTS_JOB_TIMEOUT):
+            socketio.emit('tts_chunk', {
+                'stream_id': stream_id,
+                'seq': seq,
+                'final': seq == len(sentences) - 1,
+                'audio': audio,
+                'text': sentence
+            }, room=room)
+
+            if time_to_first_audio is None:
+                time_to_first_audio = (time.perf_counter() - started) * 1000
+    except Exception as e:
+        socketio.emit('tts_error', {'message': str(e), 'stream_id': stream_id}, room=room)
+        return
+
+    total = (time.perf_counter() - started) * 1000
+    tts_stream_stats['streams'] += 1
+    tts_stream_stats['last_time_to_first_audio_ms'] = time_to_first_audio
+
+    socketio.emit('tts_stream_done', {
+        'stream_id': stream_id,
+        'chunks': len(sentences),
+        'time_to_first_audio_ms': time_to_first_audio,
+        'total_ms': total
+    }, room=room)
+    app.logger.debug("TTS stream %s: %d chunks, first audio after %.0f ms, done after %.0f ms",
+                     stream_id, len(sentences), time_to_first_audio, total)
+
 @socketio.on('inject_tts')
 def handle_tts_injection(data):
     text = data.get('text', '')
@@ -121,23 +243,37 @@ def handle_tts_injection(data):
     if not text or not room:
         return
     
-    try:
-        # Generate TTS
-        tts = gTTS(text=text, lang='en')
-        
-        # Convert to byte stream
-        tts_buffer = io.BytesIO()
-        tts.write_to_fp(tts_buffer)
-        tts_buffer.seek(0)
+    # Long scripts: send audio sentence by sentence as it is synthesized
+    if data.get('stream'):
+        if tts_pool.pending >= tts_pool.max_pending:
+            tts_pool.reject()
+            emit('tts_error', {'message': 'TTS is busy, try again shortly'})
+        elif split_sentences(text):
+            socketio.start_background_task(stream_tts, text, room)
+        return
+    
+    # Generate TTS, or reuse it if this text was spoken before
+    audio = tts_cache.get(text, 'en', tts_engine.name, tts_engine.format)
+    if audio is not None:
+        emit('tts_stream', {'audio': audio, 'text': text}, room=room)
+        return
+    
+    def on_done(audio):
+        tts_cache.put(text, 'en', tts_engine.name, tts_engine.format, audio)
         
         # Emit TTS data to the specific room
-        emit('tts_stream', {
-            'audio': tts_buffer.read(),
+        socketio.emit('tts_stream', {
+            'audio': audio,
             'text': text
         }, room=room)
     
-    except Exception as e:
-        emit('tts_error', {'message': str(e)}, room=room)
+    def on_error(e):
+        socketio.emit('tts_error', {'message': str(e)}, room=room)
+    
+    job_id = tts_pool.submit(tts_engine.synthesize, text, sid=request.sid,
+                             on_done=on_done, on_error=on_error, event='tts_job_done')
+    if job_id is None:
+        emit('tts_error', {'message': 'TTS is busy, try again shortly'})
 
 if __name__ == '__main__':
     with open('templates/index.html', 'w') as f:
@@ -342,9 +478,21 @@ if __name__ == '__main__':
             updateStatus('Peer Left');
         });
 
+        // One AudioContext for all TTS playback
+        let ttsContext = null;
+        let ttsRequestedAt = null;
+        const ttsStreams = {};
+
+        function getTTSContext() {
+            if (!ttsContext) {
+                ttsContext = new AudioContext();
+            }
+            return ttsContext;
+        }
+
         socket.on('tts_stream', (data) => {
             // Handle TTS audio injection
-            const audioContext = new AudioContext();
+            const audioContext = getTTSContext();
             audioContext.decodeAudioData(data.audio, (buffer) => {
                 const source = audioContext.createBufferSource();
                 source.buffer = buffer;
@@ -353,6 +501,51 @@ if __name__ == '__main__':
             });
         });
 
+        // Streaming TTS: chunks may finish decoding out of order, so each one
+        // waits for its turn and is then scheduled right after the previous
+        // one, which makes the sentences play back without gaps
+        socket.on('tts_chunk', (data) => {
+            const audioContext = getTTSContext();
+            let stream = ttsStreams[data.stream_id];
+            if (!stream) {
+                stream = ttsStreams[data.stream_id] = { decoded: {}, nextSeq: 0, nextTime: 0, lastSeq: null };
+            }
+            if (data.final) {
+                stream.lastSeq = data.seq;
+            }
+
+            audioContext.decodeAudioData(data.audio, (buffer) => {
+                stream.decoded[data.seq] = buffer;
+
+                while (stream.decoded[stream.nextSeq]) {
+                    const source = audioContext.createBufferSource();
+                    source.buffer = stream.decoded[stream.nextSeq];
+                    source.connect(audioContext.destination);
+
+                    const startAt = Math.max(audioContext.currentTime, stream.nextTime);
+                    source.start(startAt);
+                    stream.nextTime = startAt + source.buffer.duration;
+
+                    if (stream.nextSeq === 0 && ttsRequestedAt !== null) {
+                        console.log(`TTS time to first audio: ${Math.round(performance.now() - ttsRequestedAt)} ms`);
+                        ttsRequestedAt = null;
+                    }
+
+                    delete stream.decoded[stream.nextSeq];
+                    stream.nextSeq++;
+                }
+
+                if (stream.lastSeq !== null && stream.nextSeq > stream.lastSeq) {
+                    delete ttsStreams[data.stream_id];
+                }
+            });
+        });
+
+        socket.on('tts_stream_done', (data) => {
+            console.log(`TTS stream of ${data.chunks} chunks: first audio sent after ` +
+                        `${Math.round(data.time_to_first_audio_ms)} ms, last after ${Math.round(data.total_ms)} ms`);
+        });
+
         // End Call
         endCallBtn.onclick = () => {
             socket.emit('leave_call');
@@ -427,9 +620,11 @@ if __name__ == '__main__':
 
         function sendTTS(text) {
             if (text && currentRoom) {
+                ttsRequestedAt = performance.now();
                 socket.emit('inject_tts', { 
                     text: text, 
-                    room: currentRoom 
+                    room: currentRoom,
+                    stream: true
                 });
                 ttsInput.value = '';
                 ttsFileInput.value = '';
@@ -1,9 +1,12 @@
 import os
-from flask import Flask, Response, render_template, send_file
+import sys
+from flask import Flask, render_template, send_file, request, jsonify
 import pyaudio
-import wave
-import io
-import threading
+
+# The call, TTS and recording modules are shared with the root server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from recording_sessions import RecordingManager
 
 app = Flask(__name__)
 
@@ -13,82 +16,97 @@ FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 44100
 RECORD_SECONDS = 5
-WAVE_OUTPUT_FILENAME = "output.wav"
+RECORDINGS_DIR = "recordings"
+# Start a new file every this many seconds of audio, 0 records one file
+RECORD_SEGMENT_SECONDS = int(os.environ.get('RECORD_SEGMENT_SECONDS', 0))
+# Let a fronting proxy send recording files: Flask sets X-Sendfile (Apache
+# mod_xsendfile, lighttpd), nginx would need X-Accel-Redirect instead
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+# Retention: finished recordings older than this, or past the size budget, are deleted
+RECORDING_MAX_AGE = int(os.environ.get('RECORDING_MAX_AGE', 24 * 3600))
+RECORDING_MAX_BYTES = int(os.environ.get('RECORDING_MAX_BYTES', 2 * 1024 ** 3))
 
-# Global variables for audio streaming
-is_recording = False
-audio_buffer = io.BytesIO()
 pyaudio_instance = pyaudio.PyAudio()
 
-def record_audio():
-    global is_recording, audio_buffer
-    stream = pyaudio_instance.open(format=FORMAT,
-                                   channels=CHANNELS,
-                                   rate=RATE,
-                                   input=True,
-                                   frames_per_buffer=CHUNK)
-    
-    # Reset buffer
-    audio_buffer = io.BytesIO()
-    is_recording = True
-    
-    while is_recording:
-        data = stream.read(CHUNK)
-        audio_buffer.write(data)
-    
-    stream.stop_stream()
-    stream.close()
+def open_input_stream(device=None):
+    return pyaudio_instance.open(format=FORMAT,
+                                 channels=CHANNELS,
+                                 rate=RATE,
+                                 input=True,
+                                 input_device_index=device,
+                                 frames_per_buffer=CHUNK)
 
-def save_audio():
-    global audio_buffer
-    audio_buffer.seek(0)
-    
-    # Create a wave file
-    with wave.open(WAVE_OUTPUT_FILENAME, 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(pyaudio_instance.get_sample_size(FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(audio_buffer.getvalue())
+# Recordings, each with its own id, input device and files; any number can run at once
+recordings = RecordingManager(RECORDINGS_DIR, open_input_stream, CHANNELS,
+                              pyaudio_instance.get_sample_size(FORMAT), RATE, CHUNK,
+                              RECORD_SEGMENT_SECONDS or None, RECORDING_MAX_AGE, RECORDING_MAX_BYTES)
+
+def recorded_file(recording_id=None):
+    # Without an id, the latest finished recording; ?segment=N picks a segment
+    session = recordings.get(recording_id) if recording_id else recordings.latest()
+    if session and session.active:
+        return None
+    segment = request.args.get('segment', 0, type=int)
+    if session and 0 <= segment < len(session.segments):
+        return session.segments[segment]
+    return None
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/recordings')
+def list_recordings():
+    return jsonify(recordings.list())
+
 @app.route('/start_recording')
 def start_recording():
-    global is_recording
-    if not is_recording:
-        recording_thread = threading.Thread(target=record_audio)
-        recording_thread.start()
-    return "Recording started"
+    # ?device=N picks a PyAudio input device, ?label= tags the recording
+    recordings.sweep()
+    try:
+        session = recordings.start(request.args.get('device', type=int), request.args.get('label'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'recording_id': session.id, 'message': "Recording started"})
 
 @app.route('/stop_recording')
-def stop_recording():
-    global is_recording
-    is_recording = False
-    save_audio()
-    return "Recording stopped and saved"
+@app.route('/stop_recording/<recording_id>')
+def stop_recording(recording_id=None):
+    if recording_id is None:
+        # Without an id, the most recently started recording that is still running
+        active = [info for info in recordings.list() if info['active']]
+        if not active:
+            return jsonify({'error': "No recording in progress"}), 404
+        recording_id = active[-1]['id']
+    
+    session = recordings.stop(recording_id)
+    if session is None:
+        return jsonify({'error': "No such recording"}), 404
+    return jsonify({'recording_id': session.id, 'message': "Recording stopped and saved"})
 
 @app.route('/audio')
-def stream_audio():
-    def generate():
-        try:
-            with open(WAVE_OUTPUT_FILENAME, 'rb') as audio_file:
-                data = audio_file.read(1024)
-                while data:
-                    yield data
-                    data = audio_file.read(1024)
-        except Exception as e:
-            print(f"Error streaming audio: {e}")
+@app.route('/audio/<recording_id>')
+def stream_audio(recording_id=None):
+    path = recorded_file(recording_id)
+    if path is None:
+        return "No recording found", 404
     
-    return Response(generate(), mimetype='audio/wav')
+    # Range requests let the player seek without fetching the whole file,
+    # ETags let it skip unchanged files; the server's sendfile does the copy
+    return send_file(path, mimetype='audio/wav', conditional=True, etag=True)
 
 @app.route('/download')
-def download_audio():
-    return send_file(WAVE_OUTPUT_FILENAME, 
+@app.route('/download/<recording_id>')
+def download_audio(recording_id=None):
+    path = recorded_file(recording_id)
+    if path is None:
+        return "No recording found", 404
+    return send_file(path, 
                      mimetype='audio/wav', 
                      as_attachment=True, 
-                     download_name='recording.wav')
+                     download_name='recording.wav',
+                     conditional=True,
+                     etag=True)
 
 if __name__ == '__main__':
     # Ensure template directory exists
@@ -124,28 +142,32 @@ if __name__ == '__main__':
         const audioPlayer = document.getElementById('audioPlayer');
         const audioSource = document.getElementById('audioSource');
 
+        let currentRecordingId = null;
+
         function startRecording() {
             fetch('/start_recording')
-                .then(response => response.text())
-                .then(text => {
-                    status.textContent = text;
+                .then(response => response.json())
+                .then(data => {
+                    status.textContent = data.message || data.error;
+                    if (data.recording_id) {
+                        currentRecordingId = data.recording_id;
+                    }
                 });
         }
 
         function stopRecording() {
-            fetch('/stop_recording')
-                .then(response => response.text())
-                .then(text => {
-                    status.textContent = text;
+            fetch(`/stop_recording/${currentRecordingId}`)
+                .then(response => response.json())
+                .then(data => {
+                    status.textContent = data.message || data.error;
                     // Reload audio source to play new recording
-                    const timestamp = new Date().getTime();
-                    audioSource.src = `/audio?t=${timestamp}`;
+                    audioSource.src = `/audio/${currentRecordingId}`;
                     audioPlayer.load();
                 });
         }
 
         function downloadAudio() {
-            window.location.href = '/download';
+            window.location.href = `/download/${currentRecordingId}`;
         }
     </script>
 </body>
@@ -0,0 +1,94 @@
+import collections
+import threading
+
+LISTENER_BUFFER = 25  # messages buffered per listener before the oldest is dropped
+MAX_IN_FLIGHT = 2  # unacknowledged messages per listener
+
+
+class Listener:
+    """
+    One client's ring buffer of audio messages waiting to be sent
+    """
+
+    def __init__(self, sid, buffer_size):
+        self.sid = sid
+        self.buffer = collections.deque(maxlen=buffer_size)
+        self.in_flight = 0
+        self.sent = 0
+        self.dropped = 0
+
+
+class AudioFanOut:
+    """
+    Sends every published audio message to every listener, at each one's pace.
+
+    Each listener has a bounded ring buffer. A message is only sent to a
+    listener while it has fewer than max_in_flight messages it hasn't
+    acknowledged yet; the rest wait in its buffer and, when the buffer is
+    full, the oldest message is dropped. A slow client therefore loses audio
+    instead of growing the server's send queues, and never holds up the
+    others. Clients acknowledge with the Socket.IO ack callback.
+    """
+
+    def __init__(self, socketio, event='audio_stream', buffer_size=LISTENER_BUFFER, max_in_flight=MAX_IN_FLIGHT):
+        self.socketio = socketio
+        self.event = event
+        self.buffer_size = buffer_size
+        self.max_in_flight = max_in_flight
+        self.listeners = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.listeners)
+
+    def add(self, sid):
+        with self._lock:
+            self.listeners[sid] = Listener(sid, self.buffer_size)
+
+    def remove(self, sid):
+        with self._lock:
+            self.listeners.pop(sid, None)
+
+    def publish(self, message):
+        """
+        Queue message for every listener and send it to those ready for more
+        """
+        with self._lock:
+            listeners = list(self.listeners.values())
+            for listener in listeners:
+                if len(listener.buffer) == listener.buffer.maxlen:
+                    listener.dropped += 1
+                listener.buffer.append(message)
+
+        for listener in listeners:
+            self._pump(listener)
+
+    def _pump(self, listener):
+        with self._lock:
+            if self.listeners.get(listener.sid) is not listener:
+                return
+            ready = []
+            while listener.buffer and listener.in_flight < self.max_in_flight:
+                ready.append(listener.buffer.popleft())
+                listener.in_flight += 1
+            listener.sent += len(ready)
+
+        for message in ready:
+            self.socketio.emit(self.event, message, room=listener.sid,
+                               callback=lambda *args: self._ack(listener))
+
+    def _ack(self, listener):
+        with self._lock:
+            listener.in_flight = max(0, listener.in_flight - 1)
+        self._pump(listener)
+
+    def stats(self):
+        with self._lock:
+            listeners = list(self.listeners.values())
+            return {
+                'listeners': len(listeners),
+                'sent': sum(listener.sent for listener in listeners),
+                'dropped': sum(listener.dropped for listener in listeners),
+                'buffered': sum(len(listener.buffer) for listener in listeners),
+                'in_flight': sum(listener.in_flight for listener in listeners)
+            }
@@ -2,10 +2,18 @@ import os
 import queue
 import pyaudio
 import numpy as np
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, jsonify
 from flask_socketio import SocketIO, emit
 import threading
 import base64
+import time
+
+from audio_fanout import AudioFanOut
+
+try:
+    import opuslib
+except ImportError:
+    opuslib = None
 
 # Audio configuration
 CHUNK = 1024
@@ -13,6 +21,27 @@ FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 44100
 
+# How audio frames go over the wire: 'binary' sends raw PCM as Socket.IO
+# binary attachments, 'opus' sends Opus packets (needs opuslib) and 'base64'
+# is the old text encoding, a third larger than binary
+AUDIO_TRANSPORT = os.environ.get('AUDIO_TRANSPORT', 'binary')
+
+if AUDIO_TRANSPORT == 'opus':
+    # Opus only takes 8/12/16/24/48 kHz and frames of 2.5 to 60 ms
+    RATE = 48000
+    CHUNK = 960  # 20 ms
+
+# Frames captured within this many seconds are sent together in one message
+EMIT_INTERVAL = 0.05
+CAPTURE_QUEUE_FRAMES = 100  # frames held for the broadcaster before the oldest is dropped
+
+# Client jitter buffer: audio buffered before playback starts, and at most
+JITTER_TARGET_MS = int(os.environ.get('JITTER_TARGET_MS', 100))
+JITTER_MAX_MS = int(os.environ.get('JITTER_MAX_MS', 1000))
+
+# Counters clients report in playback_stats
+PLAYBACK_COUNTERS = ('received', 'played', 'underruns', 'lost', 'late', 'dropped')
+
 # Flask and SocketIO setup
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key'
@@ -28,13 +57,29 @@ class AudioStreamer:
         self.input_stream = None
         
         # Audio queue for streaming
-        self.audio_queue = queue.Queue()
+        self.audio_queue = queue.Queue(maxsize=CAPTURE_QUEUE_FRAMES)
         
         # Streaming control flag
         self.is_streaming = False
         
         # Clients tracking
         self.connected_clients = set()
+        
+        # Listeners the broadcast thread fans audio out to
+        self.fanout = AudioFanOut(socketio)
+        
+        # Latest playback_stats report from each client
+        self.playback_stats = {}
+        
+        # Frame sequence number, so clients can spot gaps
+        self.seq = 0
+        
+        # Opus encoder, only for the opus transport
+        self.encoder = None
+        if AUDIO_TRANSPORT == 'opus':
+            if opuslib is None:
+                raise RuntimeError("The opuslib package is required for AUDIO_TRANSPORT=opus")
+            self.encoder = opuslib.Encoder(RATE, CHANNELS, opuslib.APPLICATION_AUDIO)
 
     def start_stream(self):
         """
@@ -81,29 +126,78 @@ class AudioStreamer:
                 # Read audio chunk
                 data = self.input_stream.read(CHUNK)
                 
-                # Put audio in queue
-                self.audio_queue.put(data)
+                # Put audio in queue, with its capture time in ms
+                self._enqueue((time.time() * 1000, data))
             except Exception as e:
                 print(f"Audio capture error: {e}")
                 break
 
+    def _enqueue(self, item):
+        """
+        Queue a captured frame, dropping the oldest if the broadcaster is behind
+        """
+        while True:
+            try:
+                self.audio_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.audio_queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def encode_frame(self, audio_data):
+        """
+        Encode one PCM frame for the configured transport
+        """
+        if AUDIO_TRANSPORT == 'opus':
+            return self.encoder.encode(audio_data, len(audio_data) // (2 * CHANNELS))
+        if AUDIO_TRANSPORT == 'base64':
+            return base64.b64encode(audio_data).decode('utf-8')
+        # bytes are sent as a binary attachment, no encoding needed
+        return audio_data
+
+    def encode_batch(self, batch):
+        """
+        Build the audio_stream message for a batch of (timestamp, frame) pairs
+        """
+        seq = self.seq + 1
+        self.seq += len(batch)
+        return {
+            'frames': [self.encode_frame(audio_data) for _, audio_data in batch],
+            'seq': seq,
+            'timestamp': batch[0][0],
+            'encoding': AUDIO_TRANSPORT,
+            'rate': RATE,
+            'channels': CHANNELS
+        }
+
     def _broadcast_audio(self):
         """
         Broadcast audio to all connected clients
         """
         while self.is_streaming:
             try:
-                # Get audio chunk from queue
-                if not self.audio_queue.empty():
-                    audio_data = self.audio_queue.get()
-                    
-                    # Convert to base64 for transmission
-                    encoded_audio = base64.b64encode(audio_data).decode('utf-8')
-                    
-                    # Emit to all clients
-                    socketio.emit('audio_stream', {
-                        'audio': encoded_audio
-                    })
+                # Block until a frame arrives, waking up now and then to see if we stopped
+                try:
+                    batch = [self.audio_queue.get(timeout=0.5)]
+                except queue.Empty:
+                    continue
+                
+                # Collect whatever else arrives within the emit interval
+                deadline = time.monotonic() + EMIT_INTERVAL
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self.audio_queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                
+                # Emit to all clients
+                if len(self.fanout):
+                    self.fanout.publish(self.encode_batch(batch))
             except Exception as e:
                 print(f"Audio broadcast error: {e}")
 
@@ -118,6 +212,7 @@ def handle_connect():
     """
     print("Client connected")
     audio_streamer.connected_clients.add(request.sid)
+    audio_streamer.fanout.add(request.sid)
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -126,6 +221,8 @@ def handle_disconnect():
     """
     print("Client disconnected")
     audio_streamer.connected_clients.remove(request.sid)
+    audio_streamer.fanout.remove(request.sid)
+    audio_streamer.playback_stats.pop(request.sid, None)
     
     # Stop streaming if no clients
     if not audio_streamer.connected_clients:
@@ -148,10 +245,52 @@ def stop_streaming():
     audio_streamer.stop_stream()
     emit('streaming_stopped')
 
+@socketio.on('clock_sync')
+def clock_sync(data=None):
+    """
+    Reply with the server clock, so clients can turn frame timestamps into latency
+    """
+    return {'server_time': time.time() * 1000}
+
+@socketio.on('playback_stats')
+def playback_stats(data):
+    """
+    Store a client's jitter buffer counters and measured latency
+    """
+    report = {name: int(data.get(name) or 0) for name in PLAYBACK_COUNTERS}
+    for name in ('buffered_ms', 'latency_ms'):
+        report[name] = float(data[name]) if data.get(name) is not None else None
+    audio_streamer.playback_stats[request.sid] = report
+
+def summarize_playback(reports):
+    """
+    Totals of the clients' counters, and the spread of their latencies
+    """
+    summary = {name: sum(report[name] for report in reports) for name in PLAYBACK_COUNTERS}
+    summary['clients'] = len(reports)
+    
+    latencies = sorted(report['latency_ms'] for report in reports if report['latency_ms'] is not None)
+    if latencies:
+        summary['latency_ms'] = {
+            'p50': latencies[len(latencies) // 2],
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+            'max': latencies[-1]
+        }
+    return summary
+
 # Route for main page
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', jitter_target_ms=JITTER_TARGET_MS, jitter_max_ms=JITTER_MAX_MS)
+
+@app.route('/stats')
+def stats():
+    return jsonify({
+        'streaming': audio_streamer.is_streaming,
+        'queued_frames': audio_streamer.audio_queue.qsize(),
+        'fanout': audio_streamer.fanout.stats(),
+        'playback': summarize_playback(list(audio_streamer.playback_stats.values()))
+    })
 
 # Ensure template directory exists
 os.makedirs('templates', exist_ok=True)
@@ -181,40 +320,153 @@ with open('templates/index.html', 'w') as f:
         <button onclick="startStream()">Start Stream</button>
         <button onclick="stopStream()">Stop Stream</button>
     </div>
+    <div id="playbackStats"></div>
 
     <script>
         // Socket.IO connection
         const socket = io();
-        const audioContext = new (window.AudioContext || window.webkitAudioContext)();
-        let sourceBuffer = null;
+
+        // Offset from this browser's clock to the server's, from the
+        // clock_sync round trip with the lowest delay seen
+        let clockOffset = 0;
+        let bestRtt = Infinity;
+
+        function syncClock() {
+            const sent = Date.now();
+            socket.emit('clock_sync', {}, (reply) => {
+                const received = Date.now();
+                if (received - sent <= bestRtt) {
+                    bestRtt = received - sent;
+                    clockOffset = reply.server_time - (sent + received) / 2;
+                }
+            });
+        }
+        setInterval(syncClock, 10000);
 
         // Connection status
         socket.on('connect', () => {
             document.getElementById('connectionStatus').textContent = 'Connected';
+            bestRtt = Infinity;
+            syncClock();
         });
 
         socket.on('disconnect', () => {
             document.getElementById('connectionStatus').textContent = 'Disconnected';
         });
 
-        // Audio streaming
-        socket.on('audio_stream', (data) => {
-            try {
-                // Decode base64 audio
-                const audioBuffer = base64ToArrayBuffer(data.audio);
-                
-                // Create audio source
-                audioContext.decodeAudioData(audioBuffer, (buffer) => {
-                    const source = audioContext.createBufferSource();
-                    source.buffer = buffer;
-                    source.connect(audioContext.destination);
-                    source.start(0);
-                });
-            } catch (error) {
-                console.error('Audio playback error:', error);
+        // Audio streaming: frames are raw 16-bit PCM (binary or base64) or
+        // Opus packets. They are decoded here and played by the jitter
+        // buffer worklet, which runs at the stream's sample rate.
+        let audioContext = null;
+        let playbackNode = null;
+        let playbackReady = null;
+        let opusDecoder = null;
+        const opusTimestamps = new Map();
+
+        async function setupPlayback(rate, channels) {
+            audioContext = new AudioContext({ sampleRate: rate, latencyHint: 'interactive' });
+            await audioContext.audioWorklet.addModule('/static/jitter_buffer_worklet.js');
+            playbackNode = new AudioWorkletNode(audioContext, 'jitter-buffer', {
+                outputChannelCount: [channels],
+                processorOptions: { targetMs: {{ jitter_target_ms }}, maxMs: {{ jitter_max_ms }} }
+            });
+            playbackNode.port.onmessage = (event) => reportStats(event.data);
+            playbackNode.connect(audioContext.destination);
+            audioContext.resume();
+        }
+
+        // Browsers only start audio after a user gesture
+        document.addEventListener('click', () => {
+            if (audioContext) audioContext.resume();
+        });
+
+        socket.on('audio_stream', (data, ack) => {
+            // Acknowledge right away, the server holds back audio until we do
+            if (ack) ack();
+
+            if (!playbackReady) {
+                playbackReady = setupPlayback(data.rate, data.channels);
             }
+            playbackReady.then(() => {
+                // Frames in a message are consecutive, timestamps follow from their length
+                let timestamp = data.timestamp;
+                data.frames.forEach((frame, i) => {
+                    const seq = data.seq + i;
+                    if (data.encoding === 'opus') {
+                        decodeOpus(frame, seq, timestamp + i * 20, data);
+                        return;
+                    }
+
+                    const pcm = data.encoding === 'base64' ? base64ToArrayBuffer(frame) : frame;
+                    const channels = deinterleave(new Int16Array(pcm), data.channels);
+                    queueFrame(seq, timestamp, channels);
+                    timestamp += channels[0].length / data.rate * 1000;
+                });
+            }).catch((error) => console.error('Audio playback error:', error));
         });
 
+        function deinterleave(samples, channels) {
+            const frames = samples.length / channels;
+            const planes = [];
+            for (let ch = 0; ch < channels; ch++) {
+                const plane = new Float32Array(frames);
+                for (let i = 0; i < frames; i++) {
+                    plane[i] = samples[i * channels + ch] / 32768;
+                }
+                planes.push(plane);
+            }
+            return planes;
+        }
+
+        function queueFrame(seq, timestamp, channels) {
+            playbackNode.port.postMessage({ seq, timestamp, channels }, channels.map((plane) => plane.buffer));
+        }
+
+        // Opus packets are decoded with WebCodecs; the chunk timestamp
+        // carries the sequence number through the decoder
+        function decodeOpus(packet, seq, timestamp, data) {
+            if (!opusDecoder) {
+                opusDecoder = new AudioDecoder({
+                    output: (audioData) => {
+                        const frameSeq = Math.round(audioData.timestamp / 20000);
+                        const channels = [];
+                        for (let ch = 0; ch < audioData.numberOfChannels; ch++) {
+                            const plane = new Float32Array(audioData.numberOfFrames);
+                            audioData.copyTo(plane, { planeIndex: ch, format: 'f32-planar' });
+                            channels.push(plane);
+                        }
+                        audioData.close();
+                        queueFrame(frameSeq, opusTimestamps.get(frameSeq), channels);
+                        opusTimestamps.delete(frameSeq);
+                    },
+                    error: (error) => console.error('Opus decode error:', error)
+                });
+                opusDecoder.configure({ codec: 'opus', sampleRate: data.rate, numberOfChannels: data.channels });
+            }
+
+            opusTimestamps.set(seq, timestamp);
+            opusDecoder.decode(new EncodedAudioChunk({
+                type: 'key',
+                timestamp: seq * 20000,
+                data: packet
+            }));
+        }
+
+        // Jitter buffer counters, with end-to-end latency from capture on
+        // the server to the speaker, are shown and sent back to the server
+        function reportStats(stats) {
+            const outputLatency = (audioContext.outputLatency || audioContext.baseLatency || 0) * 1000;
+            stats.latency_ms = stats.played_timestamp === null
+                ? null : Date.now() + clockOffset - stats.played_timestamp + outputLatency;
+            delete stats.played_timestamp;
+            socket.emit('playback_stats', stats);
+
+            document.getElementById('playbackStats').textContent =
+                `Buffered ${stats.buffered_ms.toFixed(0)} ms, latency ` +
+                (stats.latency_ms === null ? '-' : `${stats.latency_ms.toFixed(0)} ms`) +
+                `, underruns ${stats.underruns}, lost ${stats.lost}, late ${stats.late}, dropped ${stats.dropped}`;
+        }
+
         // Utility function to convert base64 to ArrayBuffer
         function base64ToArrayBuffer(base64) {
             const binaryString = window.atob(base64);
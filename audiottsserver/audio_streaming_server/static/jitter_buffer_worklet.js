@@ -0,0 +1,127 @@
+// Jitter buffer for the live audio stream, run on the audio rendering thread.
+//
+// The page posts decoded frames ({seq, timestamp, channels}) to the port as
+// they arrive. Frames are played strictly in sequence order: playback starts
+// once targetMs of audio is buffered, a missing sequence number is skipped
+// over (counted as lost), a frame older than the one playing is dropped
+// (late), and if the buffer grows past maxMs the oldest frame is dropped.
+// Running dry mid-stream is an underrun: silence is played while the
+// buffer fills back up to targetMs. Counters are posted back every second.
+
+class JitterBufferProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        const opts = options.processorOptions || {};
+        this.targetSamples = (opts.targetMs || 100) * sampleRate / 1000;
+        this.maxSamples = (opts.maxMs || 1000) * sampleRate / 1000;
+
+        this.frames = new Map();
+        this.bufferedSamples = 0;
+        this.nextSeq = null;
+        this.current = null;
+        this.offset = 0;
+        this.playing = false;
+        this.playedTimestamp = null;
+
+        this.stats = { received: 0, played: 0, underruns: 0, lost: 0, late: 0, dropped: 0 };
+        this.lastReport = currentTime;
+
+        this.port.onmessage = (event) => this.push(event.data);
+    }
+
+    push(frame) {
+        this.stats.received++;
+        if (this.nextSeq !== null && frame.seq < this.nextSeq) {
+            this.stats.late++;
+            return;
+        }
+
+        this.frames.set(frame.seq, frame);
+        this.bufferedSamples += frame.channels[0].length;
+
+        while (this.bufferedSamples > this.maxSamples && this.frames.size > 1) {
+            const oldest = Math.min(...this.frames.keys());
+            this.bufferedSamples -= this.frames.get(oldest).channels[0].length;
+            this.frames.delete(oldest);
+            this.stats.dropped++;
+            this.nextSeq = oldest + 1;
+        }
+    }
+
+    nextFrame() {
+        if (this.frames.size === 0) {
+            return null;
+        }
+
+        if (this.nextSeq === null || !this.frames.has(this.nextSeq)) {
+            // Frames are delivered in order, a gap never fills in: skip it
+            const seq = Math.min(...this.frames.keys());
+            if (this.nextSeq !== null) {
+                this.stats.lost += seq - this.nextSeq;
+            }
+            this.nextSeq = seq;
+        }
+
+        const frame = this.frames.get(this.nextSeq);
+        this.frames.delete(this.nextSeq);
+        this.bufferedSamples -= frame.channels[0].length;
+        this.nextSeq++;
+        this.stats.played++;
+        return frame;
+    }
+
+    process(inputs, outputs) {
+        const output = outputs[0];
+        const length = output[0].length;
+        let written = 0;
+
+        if (!this.playing && this.bufferedSamples >= this.targetSamples) {
+            this.playing = true;
+        }
+
+        while (this.playing && written < length) {
+            if (!this.current) {
+                this.current = this.nextFrame();
+                this.offset = 0;
+                if (!this.current) {
+                    this.stats.underruns++;
+                    this.playing = false;
+                    break;
+                }
+            }
+
+            const frame = this.current;
+            const frameLength = frame.channels[0].length;
+            const count = Math.min(length - written, frameLength - this.offset);
+            for (let ch = 0; ch < output.length; ch++) {
+                const source = frame.channels[Math.min(ch, frame.channels.length - 1)];
+                output[ch].set(source.subarray(this.offset, this.offset + count), written);
+            }
+
+            // Capture time (server clock) of the sample being played
+            this.playedTimestamp = frame.timestamp + this.offset / sampleRate * 1000;
+            this.offset += count;
+            written += count;
+            if (this.offset >= frameLength) {
+                this.current = null;
+            }
+        }
+
+        for (let ch = 0; ch < output.length; ch++) {
+            output[ch].fill(0, written);
+        }
+
+        if (currentTime - this.lastReport >= 1) {
+            this.lastReport = currentTime;
+            const remaining = this.current ? this.current.channels[0].length - this.offset : 0;
+            this.port.postMessage(Object.assign({
+                buffered_ms: (this.bufferedSamples + remaining) / sampleRate * 1000,
+                played_timestamp: this.playedTimestamp
+            }, this.stats));
+        }
+
+        return true;
+    }
+}
+
+registerProcessor('jitter-buffer', JitterBufferProcessor);
@@ -0,0 +1,85 @@
+import re
+import time
+
+# Sentence ends, keeping the punctuation with the sentence
+SENTENCE_END = re.compile(r'(?<=[.!?;])\s+|\n+')
+MAX_SENTENCE_CHARS = 200
+
+
+def split_sentences(text, max_chars=MAX_SENTENCE_CHARS):
+    """
+    Split text into sentences small enough to synthesize one at a time.
+
+    Sentences longer than max_chars are further split at commas, then at
+    spaces, so one run-on line in an uploaded script can't hold up playback.
+    """
+    sentences = []
+
+    for sentence in SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(', ', 0, max_chars)
+            if cut <= 0:
+                cut = sentence.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            else:
+                cut += 1
+            sentences.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            sentences.append(sentence)
+
+    return sentences
+
+
+def synthesize_stream(sentences, synthesize, submit, prefetch=2, sleep=None, timeout=None):
+    """
+    Synthesize sentences in a pipeline, yielding (seq, sentence, audio) in order.
+
+    Up to prefetch sentences are synthesized ahead while the current one is
+    being sent. submit(fn, arg) starts a job and returns its future, or None
+    when the pool is full (JobPool.try_submit; an executor's submit works
+    too). sleep, if given, is called while waiting for a result (e.g.
+    socketio.sleep) so that a green thread never blocks the event loop on a
+    real thread. A sentence that isn't synthesized within timeout seconds,
+    or can't get a worker slot in that time, raises TimeoutError.
+    """
+    pending = []
+    upcoming = list(enumerate(sentences))
+
+    def submit_next():
+        if not upcoming:
+            return
+        seq, sentence = upcoming[0]
+        future = submit(synthesize, sentence)
+        if future is not None:
+            upcoming.pop(0)
+            pending.append((seq, sentence, future))
+
+    def wait(ready):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not ready():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"TTS took longer than {timeout} s")
+            (sleep or time.sleep)(0.005)
+
+    try:
+        for _ in range(max(1, prefetch)):
+            submit_next()
+
+        while pending or upcoming:
+            if not pending:
+                # The pool was full, keep trying for a slot
+                wait(lambda: submit_next() or pending)
+
+            seq, sentence, future = pending.pop(0)
+            wait(future.done)
+
+            audio = future.result()
+            submit_next()
+            yield seq, sentence, audio
+    finally:
+        # Prefetched sentences nobody will send, free the slots of those not started yet
+        for _, _, future in pending:
+            future.cancel()
@@ -0,0 +1,108 @@
+"""
+CPU of the live_server broadcast loop: busy-wait vs blocking fan-out.
+
+Idle: how much CPU one second of waiting on an empty capture queue costs,
+for the old loop that polls audio_queue.empty() and for a blocking get with
+a timeout like the one AudioStreamer uses now.
+
+Fan-out: audio_fanout.AudioFanOut publishes batches to hundreds of
+listeners through a stand-in for Socket.IO that acknowledges at once,
+except for a few slow listeners that never acknowledge. Reports CPU per
+listener per batch and checks the slow listeners' buffers stay bounded.
+
+    python benchmarks/bench_audio_fanout.py [--listeners 100 500] [--batches 200]
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'audiottsserver', 'audio_streaming_server'))
+
+from audio_fanout import AudioFanOut
+
+
+class FakeSocketIO:
+    """
+    Acknowledges every emit straight away, except to the slow sids
+    """
+
+    def __init__(self, slow):
+        self.slow = slow
+        self.emits = 0
+
+    def emit(self, event, data, room=None, callback=None):
+        self.emits += 1
+        if room not in self.slow and callback:
+            callback()
+
+
+def idle_cpu(loop, seconds=1.0):
+    audio_queue = queue.Queue()
+    stop = threading.Event()
+    thread = threading.Thread(target=loop, args=(audio_queue, stop))
+
+    start = time.process_time()
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    return (time.process_time() - start) / seconds
+
+
+def busy_wait(audio_queue, stop):
+    while not stop.is_set():
+        if not audio_queue.empty():
+            audio_queue.get()
+
+
+def blocking_get(audio_queue, stop):
+    while not stop.is_set():
+        try:
+            audio_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+
+
+def fanout_cpu(listeners, batches, slow):
+    slow_sids = {f"sid-{n}" for n in range(slow)}
+    socketio = FakeSocketIO(slow_sids)
+    fanout = AudioFanOut(socketio)
+    for n in range(listeners):
+        fanout.add(f"sid-{n}")
+
+    # Two 1024-sample frames, about what one 50 ms batch holds at 44.1 kHz
+    message = {'frames': [bytes(2048), bytes(2048)], 'seq': 1, 'encoding': 'binary'}
+
+    start = time.process_time()
+    for _ in range(batches):
+        fanout.publish(message)
+    elapsed = time.process_time() - start
+
+    slow_buffered = max((len(fanout.listeners[sid].buffer) for sid in slow_sids), default=0)
+    return elapsed / batches / listeners, fanout.stats(), slow_buffered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listeners', type=int, nargs='+', default=[100, 500])
+    parser.add_argument('--batches', type=int, default=200)
+    parser.add_argument('--slow', type=int, default=5, help='listeners that never acknowledge')
+    args = parser.parse_args()
+
+    print(f"{'idle loop':<14} {'CPU (core %)':>12}")
+    for name, loop in (('busy-wait', busy_wait), ('blocking get', blocking_get)):
+        print(f"{name:<14} {idle_cpu(loop) * 100:>12.1f}")
+
+    print()
+    print(f"{'listeners':>9} {'us/listener/batch':>18} {'sent':>8} {'dropped':>8} {'slow buffer':>12}")
+    for listeners in args.listeners:
+        per_listener, stats, slow_buffered = fanout_cpu(listeners, args.batches, min(args.slow, listeners))
+        print(f"{listeners:>9} {per_listener * 1e6:>18.2f} {stats['sent']:>8} {stats['dropped']:>8} {slow_buffered:>12}")
+
+
+if __name__ == '__main__':
+    main()
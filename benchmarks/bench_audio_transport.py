@@ -0,0 +1,116 @@
+"""
+Wire size and server CPU of live_server audio frames per transport.
+
+Builds the audio_stream messages live_server.AudioStreamer sends for a few
+seconds of synthetic audio, in each AUDIO_TRANSPORT mode (base64, binary,
+and opus if opuslib is installed), and encodes them the way python-socketio
+does: the Socket.IO packet once per emit, then an Engine.IO packet per
+listener. Reports bytes per second each listener receives and server CPU
+per second of audio, both for the per-frame encoding and per listener.
+
+    python benchmarks/bench_audio_transport.py [--seconds 30] [--listeners 50]
+"""
+import argparse
+import base64
+import math
+import time
+
+import engineio
+import socketio
+
+try:
+    import opuslib
+except ImportError:
+    opuslib = None
+
+CHANNELS = 1
+
+# Capture settings live_server uses for each transport
+SETTINGS = {
+    'base64': (44100, 1024),
+    'binary': (44100, 1024),
+    'opus': (48000, 960),
+}
+
+
+def synthetic_frames(rate, chunk, seconds):
+    """
+    16-bit mono PCM frames of a tone with a wobbling pitch, roughly voice-like
+    """
+    frames = []
+    n = 0
+    for _ in range(int(seconds * rate / chunk)):
+        samples = bytearray()
+        for _ in range(chunk):
+            t = n / rate
+            value = 0.3 * math.sin(2 * math.pi * (220 + 40 * math.sin(2 * math.pi * 3 * t)) * t)
+            samples += int(value * 32767).to_bytes(2, 'little', signed=True)
+            n += 1
+        frames.append(bytes(samples))
+    return frames
+
+
+def make_encoder(transport, rate):
+    if transport == 'opus':
+        encoder = opuslib.Encoder(rate, CHANNELS, opuslib.APPLICATION_AUDIO)
+        return lambda data: encoder.encode(data, len(data) // (2 * CHANNELS))
+    if transport == 'base64':
+        return lambda data: base64.b64encode(data).decode('utf-8')
+    return lambda data: data
+
+
+def run(transport, seconds, listeners):
+    rate, chunk = SETTINGS[transport]
+    frames = synthetic_frames(rate, chunk, seconds)
+    encode = make_encoder(transport, rate)
+
+    wire_bytes = 0
+    frame_cpu = listener_cpu = 0.0
+    for seq, data in enumerate(frames, 1):
+        start = time.process_time()
+        message = {
+            'frames': [encode(data)],
+            'seq': seq,
+            'timestamp': time.time() * 1000,
+            'encoding': transport,
+            'rate': rate,
+            'channels': CHANNELS
+        }
+        encoded = socketio.packet.Packet(socketio.packet.EVENT, data=['audio_stream', message]).encode()
+        parts = encoded if isinstance(encoded, list) else [encoded]
+        mid = time.process_time()
+
+        # Engine.IO wraps every part again for each listener's socket
+        for _ in range(listeners):
+            for part in parts:
+                engineio.packet.Packet(engineio.packet.MESSAGE, data=part).encode()
+        end = time.process_time()
+
+        frame_cpu += mid - start
+        listener_cpu += (end - mid) / listeners
+        # Text parts go out as text frames with a one byte Engine.IO prefix
+        wire_bytes += sum(len(part) if isinstance(part, bytes) else len(part.encode('utf-8')) + 1 for part in parts)
+
+    return wire_bytes / seconds, frame_cpu / seconds * 1000, listener_cpu / seconds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=30, help='seconds of audio per transport')
+    parser.add_argument('--listeners', type=int, default=50)
+    args = parser.parse_args()
+
+    transports = ['base64', 'binary']
+    if opuslib is not None:
+        transports.append('opus')
+    else:
+        print("opuslib not installed, skipping opus")
+
+    print(f"{'transport':<10} {'kB/s per listener':>18} {'encode CPU (ms/s)':>18} {'CPU per listener (ms/s)':>24}")
+    for transport in transports:
+        bytes_per_second, frame_cpu, listener_cpu = run(transport, args.seconds, args.listeners)
+        print(f"{transport:<10} {bytes_per_second / 1000:>18.1f} {frame_cpu:>18.3f} {listener_cpu:>24.3f}")
+
+
+if __name__ == '__main__':
+    main()
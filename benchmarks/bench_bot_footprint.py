@@ -0,0 +1,169 @@
+"""
+Memory and CPU per call: aiortc bots vs Selenium Chrome bots.
+
+Runs --calls calls (two bots each, paired with each other) against a
+running Combined_server. Every bot plays --seconds of audio, then hangs up.
+
+aiortc: every bot is a bot.BotSession, all in this process and one event
+loop. Selenium: every bot is a headless Chrome driven like browser_bot.py,
+with audio_reinject.js feeding the same audio into the page.
+
+Reports peak RSS of the whole process tree (this process plus any Chrome
+and chromedriver children) and CPU seconds used, per call.
+
+    python Combined_server.py
+    python benchmarks/bench_bot_footprint.py --mode aiortc --calls 50
+    python benchmarks/bench_bot_footprint.py --mode selenium --calls 2
+"""
+import argparse
+import asyncio
+import math
+import os
+import struct
+import sys
+import threading
+import time
+import uuid
+import wave
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import psutil
+
+from tts_artifacts import ArtifactStore
+
+
+def tone_wav(seconds, rate=16000):
+    samples = b''.join(struct.pack('<h', int(8000 * math.sin(2 * math.pi * 440 * n / rate)))
+                       for n in range(int(seconds * rate)))
+    path = os.path.join(ArtifactStore().root, f"bench-{uuid.uuid4().hex}.wav")
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(samples)
+    return path
+
+
+class TreeSampler:
+    """
+    Samples RSS and CPU time of a process (default: this one) and its
+    children until stopped.
+
+    CPU time is remembered per pid, so children that exit before the end
+    (Chrome tabs, renderers) still count.
+    """
+
+    def __init__(self, interval=0.25, process=None):
+        self.interval = interval
+        self.process = process or psutil.Process()
+        self.peak_rss = 0
+        self.cpu_by_pid = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def processes(self):
+        return [self.process] + self.process.children(recursive=True)
+
+    def cpu_seconds(self):
+        return sum(self.cpu_by_pid.values())
+
+    def sample(self):
+        rss = 0
+        for process in self.processes():
+            try:
+                rss += process.memory_info().rss
+                times = process.cpu_times()
+                self.cpu_by_pid[process.pid] = times.user + times.system
+            except psutil.Error:
+                pass
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def run_aiortc(url, calls, audio_path, seconds):
+    import bot
+
+    async def swarm():
+        sessions = [bot.BotSession(url, audio=audio_path, name=f"bot-{n}", ice_servers=[],
+                                   join_data={'scenario': f"footprint-{n // 2}"},
+                                   max_duration=seconds + 60)
+                    for n in range(calls * 2)]
+        return await asyncio.gather(*(session.run() for session in sessions))
+
+    results = asyncio.run(swarm())
+    return sum(1 for result in results if 'media' in result) // 2
+
+
+def run_selenium(url, calls, audio_path, seconds):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+
+    script = open(os.path.join(ROOT, 'audio_reinject.js')).read()
+    drivers = []
+    for _ in range(calls * 2):
+        options = Options()
+        options.add_argument("--headless=new")
+        options.add_argument("--use-fake-ui-for-media-stream")
+        options.add_argument("--autoplay-policy=no-user-gesture-required")
+        driver = webdriver.Chrome(options=options)
+        driver.get(url)
+        driver.execute_script(script, "/artifacts/" + os.path.basename(audio_path))
+        driver.find_element(By.ID, "startCallButton").click()
+        drivers.append(driver)
+
+    time.sleep(seconds)
+    for driver in drivers:
+        driver.quit()
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--mode', choices=['aiortc', 'selenium'], default='aiortc')
+    parser.add_argument('--calls', type=int, default=10)
+    parser.add_argument('--seconds', type=float, default=20, help='audio played by each bot')
+    args = parser.parse_args()
+
+    audio_path = tone_wav(args.seconds)
+    sampler = TreeSampler()
+    sampler.sample()
+    base_rss = sampler.peak_rss
+    cpu_start = sampler.cpu_seconds()
+    start = time.perf_counter()
+    sampler.start()
+
+    try:
+        runner = run_aiortc if args.mode == 'aiortc' else run_selenium
+        connected = runner(args.url, args.calls, audio_path, args.seconds)
+    finally:
+        sampler.stop()
+        os.remove(audio_path)
+
+    cpu = sampler.cpu_seconds() - cpu_start
+    elapsed = time.perf_counter() - start
+
+    print(f"mode:               {args.mode}")
+    print(f"calls:              {args.calls} ({connected} with media)")
+    print(f"wall time:          {elapsed:.1f} s")
+    print(f"peak RSS per call:  {(sampler.peak_rss - base_rss) / args.calls / 1e6:.1f} MB")
+    print(f"CPU per call:       {cpu / args.calls:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Calls per minute from one host: a fresh Chrome per call vs a warm pool.
+
+Cold: every call gets a newly started Chrome, like the old browser_bot.py
+(a pool that replaces its browser after every call). Warm: the browsers
+are started once and their tabs reused, with --tabs calls per browser in
+parallel. Calls go to a running Combined_server and pair with each other;
+a call ends when its message has played or the peer hangs up, or after
+--call-seconds. "audio ms" is the median time to set up the injected
+microphone, which the warm pool mostly serves from the browser's cache.
+
+    python Combined_server.py
+    python benchmarks/bench_browser_pool.py --calls 40 --browsers 2 --tabs 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import browser_bot
+from browser_pool import BrowserPool
+
+
+def run(pool, url, wav_name, calls, parallel, call_seconds):
+    start = time.perf_counter()
+    pool.start()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        results = list(executor.map(lambda _: browser_bot.run_call(pool, url, wav_name, call_seconds), range(calls)))
+    elapsed = time.perf_counter() - start
+    pool.close()
+
+    ended = sum(1 for status, _, _ in results if status in ('playback_ended', 'peer_left'))
+    setups = [setup for _, _, setup in results if setup is not None]
+    return calls / elapsed * 60, ended, browser_bot.percentile(setups, 0.5) if setups else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default=browser_bot.SERVER_URL)
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--browsers', type=int, default=2)
+    parser.add_argument('--tabs', type=int, default=4)
+    parser.add_argument('--call-seconds', type=float, default=15)
+    args = parser.parse_args()
+
+    parallel = args.browsers * args.tabs
+    wav_audio = browser_bot.transcode_tts_to_webrtc_compatible_wav(browser_bot.create_text_to_speech("Benchmark call."))
+
+    print(f"{'setup':<28} {'calls/min':>10} {'ended':>6} {'audio ms':>9}")
+    with browser_bot.artifacts.temporary(wav_audio, ".wav") as wav_name:
+        setups = (
+            (f"cold, {parallel} browsers x 1 tab", BrowserPool(parallel, 1, max_calls=1, server_url=args.url)),
+            (f"warm, {args.browsers} browsers x {args.tabs} tabs", BrowserPool(args.browsers, args.tabs, server_url=args.url)),
+        )
+        for name, pool in setups:
+            rate, ended, setup = run(pool, args.url, wav_name, args.calls, parallel, args.call_seconds)
+            print(f"{name:<28} {rate:>10.1f} {ended:>6} {setup:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
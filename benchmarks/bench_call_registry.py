@@ -0,0 +1,67 @@
+"""
+Per-message room lookup cost for webrtc_signal relay.
+
+Compares the old linear scan over active_calls with CallRegistry.peer_of
+for a growing number of active calls. The registry time should stay flat.
+
+    python benchmarks/bench_call_registry.py [--lookups N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from call_registry import CallRegistry
+
+CALL_COUNTS = [10, 100, 1000, 10000, 50000]
+
+
+def linear_peer_of(active_calls, caller_id):
+    # The lookup webrtc_signal used to do on every message
+    for r, participants in active_calls.items():
+        if caller_id in [participants['caller1'], participants['caller2']]:
+            if participants['caller1'] == caller_id:
+                return participants['caller2']
+            return participants['caller1']
+    return None
+
+
+def time_lookups(lookup, sids, lookups):
+    picks = [random.choice(sids) for _ in range(lookups)]
+    start = time.perf_counter()
+    for sid in picks:
+        lookup(sid)
+    return (time.perf_counter() - start) / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lookups', type=int, default=2000,
+                        help='signal messages to time per call count')
+    args = parser.parse_args()
+
+    print(f"{'calls':>8} {'linear scan (us)':>18} {'registry (us)':>15}")
+    for count in CALL_COUNTS:
+        registry = CallRegistry()
+        active_calls = {}
+        sids = []
+        for i in range(count):
+            caller1, caller2 = f"sid{i}a", f"sid{i}b"
+            room = f"call_{caller1}_{caller2}"
+            registry.add_call(room, caller1, caller2)
+            active_calls[room] = {'caller1': caller1, 'caller2': caller2}
+            sids.extend((caller1, caller2))
+
+        # The scan is O(n), so keep its sample small for large call counts
+        linear_lookups = max(20, min(args.lookups, 2000000 // count))
+        linear = time_lookups(lambda sid: linear_peer_of(active_calls, sid), sids, linear_lookups)
+        indexed = time_lookups(registry.peer_of, sids, args.lookups)
+
+        print(f"{count:>8} {linear * 1e6:>18.2f} {indexed * 1e6:>15.3f}")
+
+
+if __name__ == '__main__':
+    main()
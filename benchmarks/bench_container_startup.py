@@ -0,0 +1,99 @@
+"""
+Container start-to-ready time and image size of the bot image profiles.
+
+Each run starts a fresh container and polls it with docker exec until it
+could place a call:
+
+    debug     dockerfile           Selenium server reports ready
+    headless  dockerfile.headless  virtual microphones exist and a headless Chrome starts
+    bot       dockerfile.bot       bot.py (aiortc, PyAV, Socket.IO) imports
+
+Needs docker; --build builds the images from the repo first.
+
+    python benchmarks/bench_container_startup.py --build --runs 5
+    python benchmarks/bench_container_startup.py --profile bot --profile headless
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# name: (dockerfile, command the container runs, readiness probe run with docker exec)
+PROFILES = {
+    'debug': ('dockerfile', [],
+              ['sh', '-c', "curl -sf http://localhost:4444/wd/hub/status | grep -q '\"ready\": *true'"]),
+    'headless': ('dockerfile.headless', ['sleep', 'infinity'],
+                 ['sh', '-c', "pactl list short sinks | grep -q MicOutput && "
+                              "python -c 'from browser_pool import BrowserPool; BrowserPool(1, 1).start().close()'"]),
+    'bot': ('dockerfile.bot', ['sleep', 'infinity'],
+            ['python', '-c', 'import bot']),
+}
+POLL_INTERVAL = 0.1  # seconds between readiness probes
+
+
+def docker(*args, **kwargs):
+    return subprocess.run(['docker', *args], capture_output=True, text=True, **kwargs)
+
+
+def image_tag(profile):
+    return f"robocall-{profile}"
+
+
+def build(profile):
+    dockerfile = PROFILES[profile][0]
+    subprocess.run(['docker', 'build', '-q', '-f', os.path.join(ROOT, dockerfile), '-t', image_tag(profile), ROOT],
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def image_size(profile):
+    return int(docker('image', 'inspect', '--format', '{{.Size}}', image_tag(profile), check=True).stdout)
+
+
+def start_to_ready(profile, timeout):
+    """
+    Seconds from docker run until the readiness probe passes
+    """
+    _, command, probe = PROFILES[profile]
+    start = time.perf_counter()
+    container = docker('run', '-d', image_tag(profile), *command, check=True).stdout.strip()
+    try:
+        while time.perf_counter() - start < timeout:
+            if docker('exec', container, *probe).returncode == 0:
+                return time.perf_counter() - start
+            time.sleep(POLL_INTERVAL)
+        return None
+    finally:
+        docker('rm', '-f', container)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                        help='profile to measure, may be repeated (default: all)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120, help='seconds before a container counts as failed')
+    parser.add_argument('--build', action='store_true', help='build the images first')
+    args = parser.parse_args()
+
+    profiles = args.profile or list(PROFILES)
+    if args.build:
+        for profile in profiles:
+            build(profile)
+
+    print(f"{'profile':<10} {'image MB':>9} {'ready p50 s':>12} {'min s':>7} {'max s':>7} {'failed':>7}")
+    for profile in profiles:
+        times = [start_to_ready(profile, args.timeout) for _ in range(args.runs)]
+        ready = [t for t in times if t is not None]
+        size = image_size(profile) / 1024 ** 2
+        if ready:
+            print(f"{profile:<10} {size:>9.0f} {statistics.median(ready):>12.2f} "
+                  f"{min(ready):>7.2f} {max(ready):>7.2f} {len(times) - len(ready):>7}")
+        else:
+            print(f"{profile:<10} {size:>9.0f} {'-':>12} {'-':>7} {'-':>7} {len(times):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Event loop stalls while the TTS pool runs CPU-bound jobs.
+
+Imports Combined_server with the given SIGNALING_BACKEND and, on the
+server's own event loop, runs a ticker that should wake every --tick
+seconds while the server's tts_pool runs --jobs CPU-bound jobs of --cpu
+seconds each (a pure Python loop, standing in for PyAV decoding or the
+tone engine). If the jobs ran on the event loop instead of real threads,
+signaling would freeze for as long as they do, and so does the ticker.
+
+The Redis backend is the one that matters: it monkey patches eventlet, so
+it needs a reachable Redis-protocol server. Exits with 1 if the longest gap
+between ticks exceeds --max-stall.
+
+    python benchmarks/bench_event_loop_stall.py --backend redis://localhost:6379/15
+    python benchmarks/bench_event_loop_stall.py --backend memory://
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def burn(seconds):
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', default='redis://localhost:6379/15', help='SIGNALING_BACKEND for the server')
+    parser.add_argument('--jobs', type=int, default=2, help='CPU-bound jobs submitted at once')
+    parser.add_argument('--cpu', type=float, default=1, help='seconds each job spins')
+    parser.add_argument('--tick', type=float, default=0.05, help='seconds between ticks')
+    parser.add_argument('--max-stall', type=float, default=0.25, help='longest acceptable gap between ticks')
+    args = parser.parse_args()
+
+    # The server decides how to patch eventlet at import time, from the environment
+    os.environ['SIGNALING_BACKEND'] = args.backend
+    os.chdir(ROOT)
+    import Combined_server as server
+
+    socketio = server.socketio
+    ticks = []
+    finished = []
+
+    def ticker():
+        while len(finished) < args.jobs:
+            ticks.append(time.perf_counter())
+            socketio.sleep(args.tick)
+
+    socketio.start_background_task(ticker)
+    socketio.sleep(args.tick * 4)
+
+    start = time.perf_counter()
+    for _ in range(args.jobs):
+        if server.tts_pool.submit(burn, args.cpu, on_done=finished.append,
+                                  on_error=finished.append) is None:
+            sys.exit("The TTS pool refused a job")
+    while len(finished) < args.jobs:
+        socketio.sleep(args.tick)
+    elapsed = time.perf_counter() - start
+
+    gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+    stall = max(gaps) - args.tick
+    print(f"backend:      {args.backend} (async mode {socketio.async_mode})")
+    print(f"jobs:         {args.jobs} x {args.cpu:.2f} s CPU, done after {elapsed:.2f} s")
+    print(f"ticks:        {len(ticks)} every {args.tick * 1000:.0f} ms")
+    print(f"worst stall:  {stall * 1000:.0f} ms")
+
+    sys.exit(1 if stall > args.max_stall else 0)
+
+
+if __name__ == '__main__':
+    main()
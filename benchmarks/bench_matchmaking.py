@@ -0,0 +1,86 @@
+"""
+Matchmaking load test: how many joins per second MatchQueue can pair.
+
+Producer threads enqueue callers as fast as they can while one matchmaker
+thread drains the queue in batches, the same way the servers run it. At
+the end every caller must have been paired exactly once.
+
+    python benchmarks/bench_matchmaking.py [--joins N] [--producers N] [--roles]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from matchmaking import MatchQueue
+
+
+def produce(queue, prefix, count, roles):
+    for i in range(count):
+        sid = f"{prefix}-{i}"
+        if roles:
+            # Bots may only be paired with victims and the other way round
+            if i % 2:
+                queue.enqueue(sid, role='bot', peer_role='victim')
+            else:
+                queue.enqueue(sid, role='victim', peer_role='bot')
+        else:
+            queue.enqueue(sid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--joins', type=int, default=200000, help='total callers to enqueue')
+    parser.add_argument('--producers', type=int, default=8, help='concurrent joining threads')
+    parser.add_argument('--batch', type=int, default=500, help='maximum pairs per drain')
+    parser.add_argument('--roles', action='store_true', help='pair bots with victims only')
+    args = parser.parse_args()
+
+    queue = MatchQueue()
+    per_producer = args.joins // args.producers
+    total = per_producer * args.producers
+
+    producers = [
+        threading.Thread(target=produce, args=(queue, f"p{n}", per_producer, args.roles))
+        for n in range(args.producers)
+    ]
+
+    paired = []
+    done = threading.Event()
+
+    def matchmaker():
+        while not done.is_set() or len(queue) > 1:
+            pairs = queue.drain(args.batch)
+            paired.extend(pairs)
+            if not pairs and done.is_set():
+                break
+
+    start = time.perf_counter()
+    matcher = threading.Thread(target=matchmaker)
+    matcher.start()
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    done.set()
+    matcher.join()
+    elapsed = time.perf_counter() - start
+
+    sids = [caller.sid for pair in paired for caller in pair]
+    assert len(sids) == len(set(sids)), "a caller was paired more than once"
+    assert len(sids) + len(queue) == total, "a caller was lost"
+    if args.roles:
+        for first, second in paired:
+            assert {first.role, second.role} == {'bot', 'victim'}, "role constraint violated"
+
+    print(f"joins:        {total}")
+    print(f"pairs:        {len(paired)} ({len(queue)} left waiting)")
+    print(f"elapsed:      {elapsed:.3f} s")
+    print(f"paired joins: {len(sids) / elapsed:,.0f} /s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Peak memory of recording to a BytesIO vs the streaming WavRecorder.
+
+The BytesIO path is what record_audio/save_audio used to do: append every
+chunk to an in-memory buffer, then getvalue() it into a wave file. The
+streaming path writes each chunk through wav_recorder.WavRecorder. Both
+record --seconds of 44.1 kHz mono 16-bit audio in 1024-frame chunks, as
+fast as possible; peak memory is measured with tracemalloc.
+
+    python benchmarks/bench_recorder.py [--seconds 3600] [--segment-seconds 600]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from wav_recorder import WavRecorder
+
+CHUNK = 1024
+CHANNELS = 1
+SAMPLE_WIDTH = 2
+RATE = 44100
+
+
+def bytesio_recording(path, chunks, chunk):
+    audio_buffer = io.BytesIO()
+    for _ in range(chunks):
+        audio_buffer.write(chunk)
+
+    audio_buffer.seek(0)
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(SAMPLE_WIDTH)
+        wf.setframerate(RATE)
+        wf.writeframes(audio_buffer.getvalue())
+    return [path]
+
+
+def streaming_recording(path, chunks, chunk, segment_seconds=None):
+    with WavRecorder(path, CHANNELS, SAMPLE_WIDTH, RATE, segment_seconds) as recorder:
+        for _ in range(chunks):
+            recorder.write(chunk)
+    return recorder.segments
+
+
+def measure(record, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    segments = record(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size = sum(os.path.getsize(segment) for segment in segments)
+    for segment in segments:
+        os.remove(segment)
+    return peak, elapsed, size, len(segments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=600, help='seconds of audio to record')
+    parser.add_argument('--segment-seconds', type=float, default=0, help='rotate streaming files this often')
+    args = parser.parse_args()
+
+    chunks = int(args.seconds * RATE / CHUNK)
+    chunk = bytes(CHUNK * CHANNELS * SAMPLE_WIDTH)
+
+    print(f"{'recorder':<10} {'peak memory (MB)':>17} {'time (s)':>9} {'on disk (MB)':>13} {'files':>6}")
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'output.wav')
+        runs = (
+            ('BytesIO', bytesio_recording, (path, chunks, chunk)),
+            ('streaming', streaming_recording, (path, chunks, chunk, args.segment_seconds or None)),
+        )
+        for name, record, record_args in runs:
+            peak, elapsed, size, files = measure(record, *record_args)
+            print(f"{name:<10} {peak / 1e6:>17.2f} {elapsed:>9.2f} {size / 1e6:>13.1f} {files:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""
+Signaling server load: joins/s, signal relay latency and server RSS/CPU.
+
+Drives a Combined_server with synthetic Socket.IO callers, no WebRTC media.
+Every caller joins (join_call) and, once paired, sends its peer a burst of
+trickle-ICE candidates (webrtc_signal) every --burst-interval. After --hold
+seconds the initiator hangs up (leave_call) and both join again. Joins are
+paced to --join-rate per second across all callers.
+
+Reports joins per second and join-to-connected latency, the relay latency
+of signals from sender to peer (both ends live in this process, so one
+clock), and peak RSS and CPU of the server's process tree. Signals still
+in flight when a call ends are dropped by the server, so received is a
+little below sent. --json writes the results with the commit they were
+measured on, and --baseline prints the change against such a file.
+
+    python Combined_server.py
+    python benchmarks/bench_signaling_load.py --clients 200 --join-rate 100 \\
+        --server-pid $(pgrep -f Combined_server.py | head -1) --json before.json
+
+    python benchmarks/bench_signaling_load.py --start-server --baseline before.json --json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import psutil
+import socketio
+
+from bench_bot_footprint import TreeSampler
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+CONNECT_BATCH = 50  # clients connecting at the same time during setup
+SERVER_START_TIMEOUT = 30  # seconds for --start-server to answer /stats
+
+# What a browser trickles, host candidates are the bulk of a burst
+CANDIDATE = {
+    'candidate': 'candidate:1 1 udp 2122260223 192.168.1.10 54321 typ host generation 0',
+    'sdpMid': '0',
+    'sdpMLineIndex': 0,
+}
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def latency_summary(samples):
+    if not samples:
+        return None
+    return {'count': len(samples),
+            'p50_ms': percentile(samples, 0.5) * 1000,
+            'p99_ms': percentile(samples, 0.99) * 1000}
+
+
+class Pacer:
+    """
+    Hands out start times rate per second apart, shared by all callers
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next = time.perf_counter()
+
+    async def wait(self):
+        now = time.perf_counter()
+        at = max(self.next, now)
+        self.next = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+
+class Stats:
+    def __init__(self):
+        self.joins = 0
+        self.join_latency = []
+        self.relay_latency = []
+        self.sent = 0
+        self.received = 0
+
+
+class Caller:
+    """
+    One synthetic caller: join, signal, leave, repeat
+    """
+
+    def __init__(self, url, stats, args, join_data=None):
+        self.url = url
+        self.stats = stats
+        self.args = args
+        self.join_data = join_data or {}
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.connected = asyncio.Event()
+        self.ended = asyncio.Event()
+        self.initiator = False
+        self.join_sent = 0
+
+        self.sio.on('call_connected', self.on_call_connected)
+        self.sio.on('webrtc_signal', self.on_signal)
+        self.sio.on('peer_left', self.on_peer_left)
+
+    async def on_call_connected(self, data):
+        self.stats.joins += 1
+        self.stats.join_latency.append(time.perf_counter() - self.join_sent)
+        self.initiator = bool(data.get('is_initiator'))
+        self.connected.set()
+
+    async def on_signal(self, data):
+        sent = data['signal'].get('sent')
+        if sent is not None:
+            self.stats.received += 1
+            self.stats.relay_latency.append(time.perf_counter() - sent)
+
+    async def on_peer_left(self, data=None):
+        self.ended.set()
+
+    async def connect(self):
+        await self.sio.connect(self.url, transports=['websocket'])
+
+    async def burst(self):
+        for _ in range(self.args.burst):
+            signal = dict(type='candidate', candidate=CANDIDATE, sent=time.perf_counter())
+            await self.sio.emit('webrtc_signal', {'signal': signal})
+            self.stats.sent += 1
+
+    async def call(self, deadline):
+        """
+        One call, returns False if it didn't connect before the deadline
+        """
+        self.connected.clear()
+        self.ended.clear()
+        self.join_sent = time.perf_counter()
+        await self.sio.emit('join_call', self.join_data)
+        try:
+            await asyncio.wait_for(self.connected.wait(), max(0, deadline - time.perf_counter()))
+        except asyncio.TimeoutError:
+            return False
+
+        # The initiator hangs up after --hold, the other side stays until it sees peer_left
+        hang_up_at = time.perf_counter() + self.args.hold
+        if not self.initiator:
+            hang_up_at += self.args.hold
+        while not self.ended.is_set() and time.perf_counter() < min(hang_up_at, deadline):
+            await self.burst()
+            try:
+                await asyncio.wait_for(self.ended.wait(), self.args.burst_interval)
+            except asyncio.TimeoutError:
+                pass
+        if not self.ended.is_set():
+            await self.sio.emit('leave_call', {})
+        return True
+
+    async def run(self, pacer, deadline):
+        while time.perf_counter() < deadline:
+            await pacer.wait()
+            if time.perf_counter() >= deadline or not await self.call(deadline):
+                break
+        # Don't leave a caller behind in the server's queue of waiting callers
+        await self.sio.emit('leave_call', {})
+        await self.sio.disconnect()
+
+
+async def run_load(url, args):
+    stats = Stats()
+    callers = [Caller(url, stats, args) for _ in range(args.clients)]
+    for i in range(0, len(callers), CONNECT_BATCH):
+        await asyncio.gather(*(caller.connect() for caller in callers[i:i + CONNECT_BATCH]))
+
+    pacer = Pacer(args.join_rate)
+    start = time.perf_counter()
+    await asyncio.gather(*(caller.run(pacer, start + args.duration) for caller in callers))
+    return stats, time.perf_counter() - start
+
+
+def start_server(port, **env):
+    env = dict(os.environ, PORT=str(port), **env)
+    server = subprocess.Popen([sys.executable, 'Combined_server.py'], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://localhost:{port}/stats", timeout=1)
+            return server
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError("Combined_server.py did not start")
+
+
+def stop_server(server):
+    # The debug reloader runs the app in a child process
+    try:
+        children = psutil.Process(server.pid).children(recursive=True)
+    except psutil.NoSuchProcess:
+        children = []
+    for child in children:
+        child.terminate()
+    server.terminate()
+    server.wait()
+
+
+# Metrics compared with --baseline, as paths into the results
+COMPARED = [
+    ('joins/s', ('joins_per_s',)),
+    ('join p99 ms', ('join_latency', 'p99_ms')),
+    ('relay p50 ms', ('relay_latency', 'p50_ms')),
+    ('relay p99 ms', ('relay_latency', 'p99_ms')),
+    ('server RSS MB', ('server', 'rss_peak_mb')),
+    ('server CPU %', ('server', 'cpu_percent')),
+]
+
+
+def lookup(results, path):
+    for key in path:
+        results = (results or {}).get(key)
+    return results
+
+
+def compare(baseline, results):
+    print(f"\n{'vs ' + str(baseline.get('commit'))[:10]:<16} {'before':>10} {'after':>10} {'change':>8}")
+    for name, path in COMPARED:
+        before, after = lookup(baseline, path), lookup(results, path)
+        if before is None or after is None:
+            continue
+        change = f"{(after - before) / before * 100:+.0f}%" if before else '-'
+        print(f"{name:<16} {before:>10.1f} {after:>10.1f} {change:>8}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=100, help='connected Socket.IO callers')
+    parser.add_argument('--join-rate', type=float, default=50, help='joins per second, 0 is unpaced')
+    parser.add_argument('--hold', type=float, default=2, help='seconds a call lasts')
+    parser.add_argument('--burst', type=int, default=8, help='candidates per trickle-ICE burst')
+    parser.add_argument('--burst-interval', type=float, default=0.5, help='seconds between bursts')
+    parser.add_argument('--duration', type=float, default=20, help='seconds to run')
+    parser.add_argument('--server-pid', type=int, help='sample RSS and CPU of this server process')
+    parser.add_argument('--start-server', action='store_true',
+                        help='start Combined_server.py on --port for the run and sample it')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results of an earlier --json run to compare with')
+    args = parser.parse_args()
+
+    url = args.url
+    server = None
+    if args.start_server:
+        server = start_server(args.port)
+        url = f"http://localhost:{args.port}"
+        args.server_pid = server.pid
+
+    sampler = None
+    if args.server_pid:
+        sampler = TreeSampler(process=psutil.Process(args.server_pid))
+        sampler.sample()
+        base_rss = sampler.peak_rss
+        cpu_start = sampler.cpu_seconds()
+        sampler.start()
+
+    if uvloop is not None:
+        uvloop.install()
+    try:
+        stats, elapsed = asyncio.run(run_load(url, args))
+    finally:
+        if sampler:
+            sampler.stop()
+        if server:
+            stop_server(server)
+
+    results = {
+        'commit': git_commit(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('json', 'baseline', 'server_pid')},
+        'elapsed': elapsed,
+        'joins': stats.joins,
+        'joins_per_s': stats.joins / elapsed,
+        'join_latency': latency_summary(stats.join_latency),
+        'signals_sent': stats.sent,
+        'signals_received': stats.received,
+        'signals_per_s': stats.received / elapsed,
+        'relay_latency': latency_summary(stats.relay_latency),
+    }
+    if sampler:
+        cpu = sampler.cpu_seconds() - cpu_start
+        results['server'] = {'rss_start_mb': base_rss / 1e6,
+                             'rss_peak_mb': sampler.peak_rss / 1e6,
+                             'cpu_seconds': cpu,
+                             'cpu_percent': cpu / elapsed * 100}
+
+    print(f"clients:       {args.clients} for {elapsed:.1f} s")
+    print(f"joins:         {stats.joins} ({results['joins_per_s']:.1f}/s)")
+    for name, key in (('join latency', 'join_latency'), ('relay latency', 'relay_latency')):
+        summary = results[key]
+        if summary:
+            print(f"{name + ':':<14} p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms")
+    print(f"signals:       {stats.received}/{stats.sent} relayed ({results['signals_per_s']:.0f}/s)")
+    if sampler:
+        server_stats = results['server']
+        print(f"server RSS:    {server_stats['rss_start_mb']:.0f} MB at start, {server_stats['rss_peak_mb']:.0f} MB peak")
+        print(f"server CPU:    {server_stats['cpu_seconds']:.1f} s ({server_stats['cpu_percent']:.0f}%)")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Signaling throughput across Combined_server workers sharing a Redis backend.
+
+Starts 1 to --max-workers Combined_server.py processes with one
+SIGNALING_BACKEND, so they share call state and relay emits to each other
+through Redis. Synthetic Socket.IO callers (bench_signaling_load.Caller:
+join, trickle-ICE bursts, leave, repeat) are spread over the workers, and
+the two callers of every pair sit on different workers whenever there is
+more than one, so every relayed signal crosses workers through the message
+queue. A run where signals are sent but none arrive means emits are not
+reaching clients of other workers.
+
+Reports joins and relayed signals per second, relay latency and the share
+of signals delivered for each worker count. Needs a Redis-protocol server;
+keys under the backend's prefix are deleted after every run.
+
+    python benchmarks/bench_signaling_workers.py --redis-url redis://localhost:6379/15 --clients 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import redis
+
+from bench_signaling_load import CONNECT_BATCH, Caller, Pacer, Stats, latency_summary, start_server, stop_server
+from signaling_backend import KEY_PREFIX
+
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+async def run_load(urls, args):
+    stats = Stats()
+    callers = []
+    for pair in range(args.clients // 2):
+        # A scenario of their own makes the two callers pair with each other, on neighbouring workers
+        join_data = {'scenario': f"pair-{pair}"}
+        for side in range(2):
+            url = urls[(pair + side) % len(urls)]
+            callers.append(Caller(url, stats, args, join_data))
+
+    for i in range(0, len(callers), CONNECT_BATCH):
+        await asyncio.gather(*(caller.connect() for caller in callers[i:i + CONNECT_BATCH]))
+
+    pacer = Pacer(args.join_rate)
+    start = time.perf_counter()
+    await asyncio.gather(*(caller.run(pacer, start + args.duration) for caller in callers))
+    return stats, time.perf_counter() - start
+
+
+def clear_backend(url):
+    client = redis.Redis.from_url(url)
+    for key in client.scan_iter(KEY_PREFIX + '*'):
+        client.delete(key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--redis-url', default='redis://localhost:6379/15')
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=200, help='connected Socket.IO callers, over all workers')
+    parser.add_argument('--join-rate', type=float, default=100, help='joins per second, 0 is unpaced')
+    parser.add_argument('--hold', type=float, default=2, help='seconds a call lasts')
+    parser.add_argument('--burst', type=int, default=8, help='candidates per trickle-ICE burst')
+    parser.add_argument('--burst-interval', type=float, default=0.5, help='seconds between bursts')
+    parser.add_argument('--duration', type=float, default=15, help='seconds per run')
+    parser.add_argument('--port', type=int, default=5100, help='first worker port')
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8} {'joins/s':>9} {'signals/s':>10} {'relay p50':>10} {'relay p99':>10} "
+          f"{'delivered':>10} {'speedup':>8}")
+    for count in [n for n in WORKER_COUNTS if n <= args.max_workers]:
+        clear_backend(args.redis_url)
+        ports = [args.port + n for n in range(count)]
+        servers = []
+        try:
+            for port in ports:
+                servers.append(start_server(port, SIGNALING_BACKEND=args.redis_url))
+            stats, elapsed = asyncio.run(run_load([f"http://localhost:{port}" for port in ports], args))
+        finally:
+            for server in servers:
+                stop_server(server)
+            clear_backend(args.redis_url)
+
+        rate = stats.received / elapsed
+        baseline = baseline or rate
+        relay = latency_summary(stats.relay_latency) or {'p50_ms': float('nan'), 'p99_ms': float('nan')}
+        delivered = stats.received / stats.sent if stats.sent else 0
+        print(f"{count:>8} {stats.joins / elapsed:>9.1f} {rate:>10,.0f} {relay['p50_ms']:>8.1f}ms "
+              f"{relay['p99_ms']:>8.1f}ms {delivered:>10.1%} {rate / baseline if baseline else 0:>7.2f}x")
+        if stats.sent and not stats.received:
+            print(f"         no signal reached its peer across {count} workers, is the message queue working?")
+
+
+if __name__ == '__main__':
+    main()
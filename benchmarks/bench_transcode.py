@@ -0,0 +1,86 @@
+"""
+Transcoding throughput: ffmpeg via os.system vs in-memory audio_transcode.
+
+The subprocess path is what handle_text_message and browser_bot used to
+do: write the input to a file, shell out to ffmpeg, read the output file
+back. The in-memory path is audio_transcode.transcode (PyAV if installed,
+otherwise an ffmpeg pipe). Both convert to 16 kHz mono s16 wav and are
+run at 1, 10 and 100 concurrent requests.
+
+    python benchmarks/bench_transcode.py [--input speech.mp3] [--requests N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import audio_transcode
+from audio_transcode import transcode
+
+CONCURRENCY = [1, 10, 100]
+DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'audiottsserver', 'audio_streaming_server', 'static', 'speech.mp3')
+
+
+def subprocess_transcode(data, workdir):
+    # Unique names so concurrent requests don't clobber each other
+    name = uuid.uuid4().hex
+    input_file = os.path.join(workdir, name + '.mp3')
+    output_file = os.path.join(workdir, name + '.wav')
+    with open(input_file, 'wb') as f:
+        f.write(data)
+    os.system(f'ffmpeg -loglevel error -y -i {input_file} -ar 16000 -ac 1 -c:a pcm_s16le {output_file}')
+    with open(output_file, 'rb') as f:
+        wav = f.read()
+    os.remove(input_file)
+    os.remove(output_file)
+    return wav
+
+
+def in_memory_transcode(data, workdir):
+    return transcode(data, 'wav', rate=16000, channels=1, sample_fmt='s16')
+
+
+def run(convert, data, workdir, concurrency, requests):
+    latencies = []
+
+    def one(_):
+        start = time.perf_counter()
+        convert(data, workdir)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return requests / elapsed, statistics.median(latencies), latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--input', default=DEFAULT_INPUT, help='encoded audio file to transcode')
+    parser.add_argument('--requests', type=int, default=200, help='requests per run')
+    args = parser.parse_args()
+
+    with open(args.input, 'rb') as f:
+        data = f.read()
+
+    in_memory_name = 'in-memory (PyAV)' if audio_transcode.av is not None else 'in-memory (pipe)'
+    print(f"{'path':<18} {'concurrency':>11} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, convert in (('os.system ffmpeg', subprocess_transcode), (in_memory_name, in_memory_transcode)):
+            for concurrency in CONCURRENCY:
+                rate, p50, p99 = run(convert, data, workdir, concurrency, max(args.requests, concurrency))
+                print(f"{name:<18} {concurrency:>11} {rate:>8.1f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Time to first audio byte for repeated phrases, with and without TTSCache.
+
+Plays a robocall-style workload (a few dozen openings repeated many times)
+through TTSCache.get_or_synthesize and reports the latency of cold misses,
+memory hits and disk hits (a fresh cache over the same directory, as after
+a restart). By default synthesis is simulated with a fixed delay; --gtts
+uses the real gTTS round trip.
+
+    python benchmarks/bench_tts_cache.py [--gtts] [--requests N]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tts_cache import TTSCache
+
+OPENINGS = [
+    f"Hello, this is call number {n}. We are reaching out about your car's extended warranty."
+    for n in range(36)
+]
+
+
+def simulated_synthesizer(latency):
+    def synthesize(text):
+        time.sleep(latency)
+        return text.encode('utf-8') * 200
+    return synthesize
+
+
+def gtts_synthesizer():
+    import io
+    from gtts import gTTS
+
+    def synthesize(text):
+        buffer = io.BytesIO()
+        gTTS(text=text, lang='en').write_to_fp(buffer)
+        return buffer.getvalue()
+    return synthesize
+
+
+def timed(cache, text, synthesize):
+    start = time.perf_counter()
+    cache.get_or_synthesize(text, 'en', 'bench', 'mp3', lambda: synthesize(text))
+    return time.perf_counter() - start
+
+
+def report(name, samples):
+    if not samples:
+        return
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<12} {len(samples):>8} {statistics.median(samples) * 1000:>10.3f} {p99 * 1000:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000, help='phrases to request')
+    parser.add_argument('--latency', type=float, default=0.3, help='simulated synthesis seconds')
+    parser.add_argument('--gtts', action='store_true', help='synthesize with gTTS')
+    args = parser.parse_args()
+
+    synthesize = gtts_synthesizer() if args.gtts else simulated_synthesizer(args.latency)
+
+    with tempfile.TemporaryDirectory() as disk_dir:
+        cache = TTSCache(disk_dir=disk_dir)
+        misses, memory_hits = [], []
+        for _ in range(args.requests):
+            text = random.choice(OPENINGS)
+            before = cache.misses
+            elapsed = timed(cache, text, synthesize)
+            (misses if cache.misses > before else memory_hits).append(elapsed)
+
+        # Same directory, empty memory tier: every first request is a disk hit
+        restarted = TTSCache(disk_dir=disk_dir)
+        disk_hits = [timed(restarted, text, synthesize) for text in OPENINGS]
+
+        print(f"{'path':<12} {'requests':>8} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+        report('miss', misses)
+        report('memory hit', memory_hits)
+        report('disk hit', disk_hits)
+        print()
+        print("counters:", cache.stats())
+
+
+if __name__ == '__main__':
+    main()
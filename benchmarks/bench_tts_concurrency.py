@@ -0,0 +1,111 @@
+"""
+Concurrent TTS requests each get their own audio back.
+
+N clients connect to a running Combined_server and send N distinct texts
+at the same moment, each tagged with a request_id. Every client must get
+an audio_message for its own request_id, and no two requests may get the
+same audio. Requests are sent private, so each client receives only its
+own audio rather than everyone's. With the deterministic tone engine the
+audio is also checked byte for byte against a local synthesis of the same
+text.
+
+The server refuses requests beyond TTS_MAX_PENDING (32) queued and running
+jobs; those are reported as rejected, not missing. Keep --clients within
+that to check every client gets its own answer.
+
+    TTS_ENGINE=tone python Combined_server.py
+    python benchmarks/bench_tts_concurrency.py --clients 30 --engine tone
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import socketio
+
+from tts_engines import get_engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--engine', help='engine the server uses, to verify audio content locally')
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    received = {}
+    rejected = set()
+    failed = set()
+    done = threading.Semaphore(0)
+    clients = []
+    requests = {}
+
+    for n in range(args.clients):
+        request_id = f"{run_id}-{n}"
+        text = f"Caller {n} of run {run_id}, this is your personal message."
+        requests[request_id] = text
+
+        client = socketio.Client()
+
+        def on_audio(data, request_id=request_id):
+            if data.get('request_id') == request_id and request_id not in received:
+                received[request_id] = (data['audio'], time.perf_counter())
+                done.release()
+
+        def on_error(data, request_id=request_id):
+            if data.get('request_id') != request_id or request_id in rejected or request_id in failed:
+                return
+            # Busy means the server was at TTS_MAX_PENDING, anything else is a failed synthesis
+            (rejected if 'busy' in data.get('message', '') else failed).add(request_id)
+            done.release()
+
+        client.on('audio_message', on_audio)
+        client.on('error', on_error)
+        client.connect(args.url, transports=['websocket'])
+        clients.append(client)
+
+    start = time.perf_counter()
+    for client, (request_id, text) in zip(clients, requests.items()):
+        client.emit('text_message', {'text': text, 'request_id': request_id, 'private': True})
+
+    deadline = start + args.timeout
+    for _ in requests:
+        if not done.acquire(timeout=max(0, deadline - time.perf_counter())):
+            break
+
+    missing = [request_id for request_id in requests
+               if request_id not in received and request_id not in rejected and request_id not in failed]
+    audio = [received[request_id][0] for request_id in requests if request_id in received]
+    duplicates = len(audio) - len(set(audio))
+
+    mismatched = 0
+    if args.engine:
+        engine = get_engine(args.engine)
+        for request_id, (data, _) in received.items():
+            if engine.format == 'wav' and data != engine.synthesize(requests[request_id]):
+                mismatched += 1
+
+    elapsed = max((t for _, t in received.values()), default=start) - start
+    print(f"requests:   {len(requests)}")
+    print(f"answered:   {len(received)} in {elapsed:.2f} s")
+    print(f"rejected:   {len(rejected)}")
+    print(f"failed:     {len(failed)}")
+    print(f"missing:    {len(missing)}")
+    print(f"duplicates: {duplicates}")
+    if args.engine:
+        print(f"mismatched: {mismatched}")
+
+    for client in clients:
+        client.disconnect()
+
+    sys.exit(1 if missing or failed or duplicates or mismatched else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare TTS engines on synthesis latency and real-time factor.
+
+Each engine synthesizes the same set of sentences. Latency is the time
+synthesize() takes; the real-time factor (RTF) is latency divided by the
+duration of the audio it produced, so below 1.0 is faster than real time.
+mp3 output is decoded with ffmpeg to measure its duration. Engines that
+are not usable on this machine are reported and skipped.
+
+    python benchmarks/bench_tts_engines.py [--engines gtts,espeak,tone] [--rounds N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tts_engines import ENGINES, get_engine, wav_duration
+
+SENTENCES = [
+    "Hello, this is a robocall.",
+    "We are calling about your car's extended warranty.",
+    "Please press one to speak with a representative, or stay on the line.",
+    "The quick brown fox jumped over the lazy dog while the operator waited patiently for a reply.",
+]
+
+
+def audio_duration(audio, fmt):
+    if fmt == 'wav':
+        return wav_duration(audio)
+
+    result = subprocess.run(
+        ['ffmpeg', '-i', 'pipe:0', '-f', 'wav', 'pipe:1'],
+        input=audio, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+    )
+    return wav_duration(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--engines', default=','.join(ENGINES), help='comma-separated engine names')
+    parser.add_argument('--rounds', type=int, default=3, help='times to synthesize each sentence')
+    args = parser.parse_args()
+
+    print(f"{'engine':<8} {'p50 latency (ms)':>17} {'max (ms)':>10} {'RTF':>7}")
+    for name in args.engines.split(','):
+        engine = get_engine(name)
+        latencies = []
+        synth_total = audio_total = 0.0
+
+        try:
+            for _ in range(args.rounds):
+                for sentence in SENTENCES:
+                    start = time.perf_counter()
+                    audio = engine.synthesize(sentence)
+                    elapsed = time.perf_counter() - start
+
+                    latencies.append(elapsed)
+                    synth_total += elapsed
+                    audio_total += audio_duration(audio, engine.format)
+        except Exception as e:
+            print(f"{name:<8} unavailable: {e}")
+            continue
+
+        print(f"{name:<8} {statistics.median(latencies) * 1000:>17.1f} "
+              f"{max(latencies) * 1000:>10.1f} {synth_total / audio_total:>7.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Signaling latency while the server is busy with TTS.
+
+Two synthetic clients join a call on a running Combined_server and bounce
+webrtc_signal messages back and forth, measuring the round trip. The run
+is done once idle and once while a third client keeps the TTS pool busy
+with distinct text_message requests (distinct, so the TTS cache can't
+answer them). With TTS offloaded from the event loop, p99 should barely
+move between the two.
+
+Start the server first, with a real engine, e.g.
+    TTS_ENGINE=espeak python Combined_server.py
+    python benchmarks/bench_tts_offload.py --url http://localhost:5000
+"""
+import argparse
+import threading
+import time
+import uuid
+
+import socketio
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def connect_pair(url):
+    caller, callee = socketio.Client(), socketio.Client()
+    connected = threading.Barrier(3)
+
+    for client in (caller, callee):
+        client.on('call_connected', lambda data: connected.wait())
+        client.connect(url, transports=['websocket'])
+        client.emit('join_call', {'scenario': f"bench-{uuid.uuid4().hex}"})
+
+    # Both sides share a unique scenario tag, so they are paired with each other
+    connected.wait(timeout=10)
+    return caller, callee
+
+
+def measure(caller, callee, count, interval):
+    latencies = []
+    answered = threading.Event()
+
+    # The callee echoes every signal, the caller times the round trip
+    callee.on('webrtc_signal', lambda data: callee.emit('webrtc_signal', {'signal': data['signal']}))
+
+    def on_echo(data):
+        latencies.append(time.perf_counter() - data['signal']['sent'])
+        answered.set()
+    caller.on('webrtc_signal', on_echo)
+
+    for _ in range(count):
+        answered.clear()
+        caller.emit('webrtc_signal', {'signal': {'type': 'candidate', 'sent': time.perf_counter()}})
+        answered.wait(timeout=5)
+        time.sleep(interval)
+
+    return latencies
+
+
+def flood_tts(url, stop):
+    client = socketio.Client()
+    client.connect(url, transports=['websocket'])
+    n = 0
+    while not stop.is_set():
+        client.emit('text_message', {'text': f"This is load test sentence number {n}, please hold the line."})
+        n += 1
+        time.sleep(0.05)
+    client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--signals', type=int, default=500, help='round trips per phase')
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between signals')
+    args = parser.parse_args()
+
+    caller, callee = connect_pair(args.url)
+
+    idle = measure(caller, callee, args.signals, args.interval)
+
+    stop = threading.Event()
+    flooder = threading.Thread(target=flood_tts, args=(args.url, stop))
+    flooder.start()
+    time.sleep(1)
+    loaded = measure(caller, callee, args.signals, args.interval)
+    stop.set()
+    flooder.join()
+
+    print(f"{'phase':<10} {'signals':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for name, samples in (('idle', idle), ('tts load', loaded)):
+        print(f"{name:<10} {len(samples):>8} {percentile(samples, 0.5) * 1000:>9.2f} "
+              f"{percentile(samples, 0.99) * 1000:>9.2f}")
+
+    caller.disconnect()
+    callee.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Time to first audio for a long TTS script, whole vs streamed.
+
+Whole: the full text is synthesized before anything is sent, like the old
+inject_tts. Streamed: the text is split into sentences and synthesized in a
+pipeline (tts_streaming.synthesize_stream), so the first sentence can be
+sent while the rest are still being synthesized.
+
+Synthesis is simulated with a latency of --base + --per-char * len(text),
+or done with a real engine via --engine.
+
+    python benchmarks/bench_tts_streaming.py [--script FILE] [--engine gtts]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SERVER_DIR = os.path.join(ROOT, 'audiottsserver', 'audio_streaming_server')
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, ROOT)
+
+from tts_engines import get_engine
+from tts_streaming import split_sentences, synthesize_stream
+
+DEFAULT_SCRIPT = ' '.join([open(os.path.join(SERVER_DIR, 'test input text.txt')).read().strip()] * 6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--script', help='text file to synthesize (default: repeated test input)')
+    parser.add_argument('--engine', help='real TTS engine to use instead of the simulation')
+    parser.add_argument('--base', type=float, default=0.25, help='simulated seconds per request')
+    parser.add_argument('--per-char', type=float, default=0.003, help='simulated seconds per character')
+    parser.add_argument('--prefetch', type=int, default=2)
+    args = parser.parse_args()
+
+    text = open(args.script).read() if args.script else DEFAULT_SCRIPT
+
+    if args.engine:
+        engine = get_engine(args.engine)
+        synthesize = engine.synthesize
+    else:
+        def synthesize(chunk):
+            time.sleep(args.base + args.per_char * len(chunk))
+            return b'\0' * len(chunk)
+
+    start = time.perf_counter()
+    synthesize(text)
+    whole = time.perf_counter() - start
+
+    sentences = split_sentences(text)
+    with ThreadPoolExecutor(max_workers=max(1, args.prefetch)) as executor:
+        start = time.perf_counter()
+        first = None
+        for _ in synthesize_stream(sentences, synthesize, executor.submit, prefetch=args.prefetch):
+            if first is None:
+                first = time.perf_counter() - start
+        streamed_total = time.perf_counter() - start
+
+    print(f"script: {len(text)} characters, {len(sentences)} sentences")
+    print(f"{'mode':<10} {'first audio (ms)':>17} {'all audio (ms)':>15}")
+    print(f"{'whole':<10} {whole * 1000:>17.0f} {whole * 1000:>15.0f}")
+    print(f"{'streamed':<10} {first * 1000:>17.0f} {streamed_total * 1000:>15.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Churn soak test for call state: memory must stay flat over time.
+
+Simulates callers joining, getting paired, signaling and hanging up against
+MatchQueue and CallRegistry, with a share of them "crashing" (never leaving)
+so that only the TTL sweeper can clean them up. Every report interval it
+prints the structure sizes and traced Python memory; on a healthy build all
+of them level off after the first TTL and stay there.
+
+    python benchmarks/soak_call_churn.py --duration 86400   # 24 hour run
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from call_registry import CallRegistry
+from matchmaking import MatchQueue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run')
+    parser.add_argument('--rate', type=int, default=2000, help='joins per second')
+    parser.add_argument('--crash-ratio', type=float, default=0.05,
+                        help='share of callers that never leave')
+    parser.add_argument('--call-ttl', type=float, default=5, help='idle call TTL in seconds')
+    parser.add_argument('--wait-ttl', type=float, default=5, help='waiting caller TTL in seconds')
+    parser.add_argument('--report-every', type=float, default=10, help='seconds between reports')
+    args = parser.parse_args()
+
+    registry = CallRegistry()
+    queue = MatchQueue()
+    crashed = set()
+    live = []
+    serial = 0
+
+    tracemalloc.start()
+    start = last_report = last_sweep = time.time()
+    print(f"{'elapsed':>8} {'calls':>7} {'sids':>7} {'waiting':>8} {'traced KiB':>11}")
+
+    while time.time() - start < args.duration:
+        tick = time.time()
+
+        # Joins for this tick
+        for _ in range(args.rate // 10):
+            sid = f"sid{serial}"
+            serial += 1
+            queue.enqueue(sid)
+            if random.random() < args.crash_ratio:
+                crashed.add(sid)
+
+        for first, second in queue.drain():
+            room = f"call_{first.sid}_{second.sid}"
+            registry.add_call(room, first.sid, second.sid)
+            live.append(room)
+
+        # Signaling and hang-ups from the callers that are still around
+        random.shuffle(live)
+        still_live = []
+        for room in live:
+            participants = registry.get(room)
+            if participants is None:
+                continue
+            caller1, caller2 = participants['caller1'], participants['caller2']
+            if caller1 in crashed or caller2 in crashed:
+                # Never leaves, the sweeper has to drop it
+                crashed.discard(caller1)
+                crashed.discard(caller2)
+                continue
+            if random.random() < 0.5:
+                registry.peer_of(caller1)
+                registry.touch(caller1)
+                still_live.append(room)
+            else:
+                registry.remove_sid(caller1)
+        live = still_live
+
+        now = time.time()
+        if now - last_sweep >= 1:
+            registry.expire_idle(args.call_ttl, now)
+            for caller in queue.expire(args.wait_ttl, now):
+                crashed.discard(caller.sid)
+            last_sweep = now
+
+        if now - last_report >= args.report_every:
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"{now - start:>8.0f} {len(registry):>7} {registry.sid_count():>7} "
+                  f"{len(queue):>8} {current / 1024:>11.0f}")
+            last_report = now
+
+        time.sleep(max(0, 0.1 - (time.time() - tick)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,190 +1,342 @@
-import socketio
+import argparse
 import asyncio
-from aiortc import RTCPeerConnection, RTCIceCandidate, RTCSessionDescription
-from aiortc.contrib.media import MediaPlayer, MediaRelay, MediaStreamTrack
-from aiortc.contrib.signaling import TcpSocketSignaling
-from aiortc.mediastreams import AudioStreamTrack
+import fractions
+import functools
+import time
 
-from aiortc import RTCSessionDescription, VideoStreamTrack
-from aiortc.contrib.signaling import TcpSocketSignaling
+import av
+import socketio
+from aiortc import RTCConfiguration, RTCIceServer, RTCPeerConnection, RTCSessionDescription
+from aiortc.contrib.media import MediaBlackhole, MediaRecorder
+from aiortc.mediastreams import MediaStreamError, MediaStreamTrack
+from aiortc.sdp import candidate_from_sdp
 
+from audio_transcode import transcode
+from tts_engines import get_engine
 
-# Create a Socket.IO client instance
-# sio = socketio.Client()
-# SocketIO setup
-sio = socketio.AsyncClient()
+# Outgoing audio: 48 kHz mono, sent in 20 ms frames like a browser
+SAMPLE_RATE = 48000
+FRAME_SAMPLES = 960
+FRAME_BYTES = FRAME_SAMPLES * 2
 
 # WebRTC configuration
-ice_servers = [{"urls": "stun:stun.l.google.com:19302"}]
-peer_connection = RTCPeerConnection(configuration={"iceServers": ice_servers})
-
-
-state = {}
-
-# Define event handlers
-@sio.event
-def connect():
-    print("Connected to the server!")
-
-@sio.event
-def disconnect():
-    print("Disconnected from the server!")
-
-@sio.event
-def message(data):
-    print(f"Message received: {data}")
-
-@sio.on("waiting_for_peer")
-def process_waiting_event(data):
-    print("waiting for a peer")
-    print(data)
-    return
-    
-
-@sio.on("call_connected")
-async def connect_to_call(data):
-    
-    print("Connected to call", data)
-    state["is_initiator"] = data["is_initiator"]
-
-    if state["is_initiator"]:
-
-        await initiate_call(state["is_initiator"])
-    
-
-
-@sio.on('*')
-def any_event(event, sid, data):
-    print("no event handler for", event)
-
-
-# Handle ICE candidates
-@sio.on("webrtc_signal")
-async def handle_webrtc_signal(data):
-    signal = data.get("signal")
-    if signal.get("type") == "candidate":
-        candidate = signal.get("candidate")
-        ice_candidate = RTCIceCandidate(candidate)
-        await peer_connection.addIceCandidate(ice_candidate)
-    elif signal.get("type") in ["offer", "answer"]:
-        desc = RTCSessionDescription(signal.get("sdp"), signal.get("type"))
-        await peer_connection.setRemoteDescription(desc)
-
-# ICE candidate event
-@peer_connection.on("icecandidate")
-async def on_icecandidate(candidate):
-    if candidate:
-        await sio.emit("webrtc_signal", {"signal": {"type": "candidate", "candidate": candidate}})
-
-# Track event
-@peer_connection.on("track")
-async def on_track(track):
-    if track.kind == "audio":
-        # Play audio
-        print("Received audio track")
-        remote_player = MediaPlayer(track)
-        await remote_player.play()
-
-# Add local tracks
-async def add_local_tracks(local_stream):
-    if local_stream:
-        for track in local_stream.getTracks():
-            peer_connection.addTrack(track)
-
-# Initiator logic
-async def initiate_call(is_initiator):
-    if is_initiator:
-        
-        # aiortc.exceptions.InternalError: Cannot create an offer with no media and no data channels
-
-        # Add local tracks to the peer connection
-        local_stream = MediaStreamTrack(kind="audio")
-
-
-        await setup_webrtc_and_run("127.0.0.1", 5000, 2)
-
-        # await add_local_tracks(local_stream)
-
-        # # Create an offer
-        # offer = await peer_connection.createOffer()
-
-        # await peer_connection.setLocalDescription(offer)
-        # await sio.emit("webrtc_signal", {"signal": {"sdp": offer.sdp, "type": offer.type}})
-
-
-async def setup_webrtc_and_run(ip_address, port, camera_id):
-    signaling = TcpSocketSignaling(ip_address, port)
-    
-    
-    audio_sender = peer_connection.addTrack(AudioStreamTrack(kind="audio"))
-
-    peer_connection.addTrack(audio_sender)
-
-    try:
-        await signaling.connect()
-
-        @peer_connectionpc.on("datachannel")
-        def on_datachannel(channel):
-            print(f"Data channel established: {channel.label}")
-
-        @peer_connection.on("connectionstatechange")
+ICE_SERVERS = ["stun:stun.l.google.com:19302"]
+MAX_CALL_SECONDS = 120  # safety net, calls normally end on playback or peer_left
+
+
+@functools.lru_cache(maxsize=32)
+def load_wav(path):
+    """
+    Decode an audio file to outgoing PCM, once per process however many bots play it
+    """
+    with open(path, 'rb') as f:
+        return transcode(f.read(), 'pcm', rate=SAMPLE_RATE, channels=1, sample_fmt='s16')
+
+
+@functools.lru_cache(maxsize=256)
+def synthesize_pcm(text):
+    """
+    Synthesize text with the configured TTS engine, as outgoing PCM
+    """
+    engine = get_engine()
+    return transcode(engine.synthesize(text, lang='en'), 'pcm', rate=SAMPLE_RATE, channels=1, sample_fmt='s16')
+
+
+class AudioQueueTrack(MediaStreamTrack):
+    """
+    Outgoing audio track fed from a queue of PCM clips.
+
+    Frames are paced in real time. When nothing is queued the track sends
+    silence, so clips can be queued at any point of the call without
+    renegotiating. idle is set whenever the queue has run dry.
+    """
+
+    kind = "audio"
+
+    def __init__(self):
+        super().__init__()
+        self.clips = []
+        self.offset = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self._start = None
+        self._timestamp = 0
+
+    def play(self, pcm):
+        self.clips.append(pcm)
+        self.idle.clear()
+
+    def _next_chunk(self):
+        chunk = b''
+        while self.clips and len(chunk) < FRAME_BYTES:
+            clip = self.clips[0]
+            take = clip[self.offset:self.offset + FRAME_BYTES - len(chunk)]
+            chunk += take
+            self.offset += len(take)
+            if self.offset >= len(clip):
+                self.clips.pop(0)
+                self.offset = 0
+
+        if not self.clips:
+            self.idle.set()
+        return chunk.ljust(FRAME_BYTES, b'\0')
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        if self._start is None:
+            self._start = time.time()
+        else:
+            self._timestamp += FRAME_SAMPLES
+            wait = self._start + self._timestamp / SAMPLE_RATE - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        frame = av.AudioFrame(format='s16', layout='mono', samples=FRAME_SAMPLES)
+        frame.planes[0].update(self._next_chunk())
+        frame.pts = self._timestamp
+        frame.sample_rate = SAMPLE_RATE
+        frame.time_base = fractions.Fraction(1, SAMPLE_RATE)
+        return frame
+
+
+def parse_candidate(data):
+    """
+    Turn a browser RTCIceCandidate (as JSON) into an aiortc candidate
+    """
+    sdp = data.get('candidate') or ''
+    if not sdp:
+        return None  # end-of-candidates
+    candidate = candidate_from_sdp(sdp.split(':', 1)[1] if sdp.startswith('candidate:') else sdp)
+    candidate.sdpMid = data.get('sdpMid')
+    candidate.sdpMLineIndex = data.get('sdpMLineIndex')
+    return candidate
+
+
+class BotSession:
+    """
+    One headless robocaller: a Socket.IO client and a peer connection.
+
+    Speaks the same join_call / webrtc_signal protocol as the browser page.
+    Once media flows it plays its audio (a file or TTS text), records what
+    the other side sends if record_path is set, and hangs up when playback
+    is done (hangup_after_playback), the peer leaves or max_duration passes.
+    run() returns a dict describing how the call went.
+    """
+
+    def __init__(self, url, audio=None, text=None, record_path=None, join_data=None,
+                 hangup_after_playback=True, max_duration=MAX_CALL_SECONDS, ice_servers=ICE_SERVERS, name='bot'):
+        self.url = url
+        self.audio = audio
+        self.text = text
+        self.record_path = record_path
+        self.join_data = join_data or {}
+        self.hangup_after_playback = hangup_after_playback
+        self.max_duration = max_duration
+        self.ice_servers = ice_servers
+        self.name = name
+
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.pc = None
+        self.track = None
+        self.sink = None
+        self.finished = None
+        self.media_ready = None
+        self.signal_lock = None
+        self.result = {'name': name, 'status': None}
+        self._started_at = None
+
+        self.sio.on('waiting_for_peer', self.on_waiting)
+        self.sio.on('call_connected', self.on_call_connected)
+        self.sio.on('webrtc_signal', self.on_webrtc_signal)
+        self.sio.on('peer_left', self.on_peer_left)
+        self.sio.on('join_timeout', self.on_join_timeout)
+        self.sio.on('disconnect', self.on_disconnect)
+
+    def _elapsed(self):
+        return time.perf_counter() - self._started_at
+
+    def finish(self, status):
+        if self.result['status'] is None:
+            self.result['status'] = status
+            self.result['duration'] = self._elapsed()
+            self.finished.set()
+
+    async def load_audio(self):
+        # Decoding and TTS block, keep them off the event loop
+        loop = asyncio.get_running_loop()
+        if self.text:
+            return await loop.run_in_executor(None, synthesize_pcm, self.text)
+        if self.audio:
+            return await loop.run_in_executor(None, load_wav, self.audio)
+        return None
+
+    async def run(self):
+        self.finished = asyncio.Event()
+        self.media_ready = asyncio.Event()
+        # Socket.IO handlers run concurrently, signals must be applied in order
+        self.signal_lock = asyncio.Lock()
+        self._started_at = time.perf_counter()
+
+        try:
+            pcm = await self.load_audio()
+            await self.sio.connect(self.url, transports=['websocket'])
+            await self.sio.emit('join_call', self.join_data)
+            self.result['joined'] = self._elapsed()
+
+            try:
+                await asyncio.wait_for(self._wait_for_media(pcm), self.max_duration)
+            except asyncio.TimeoutError:
+                self.finish('timeout')
+        except socketio.exceptions.ConnectionError as e:
+            print(f"{self.name}: failed to connect to the server: {e}")
+            self.finish('connect_error')
+        except Exception as e:
+            # Audio, peer connection or Socket.IO errors end this bot's call, not the swarm
+            print(f"{self.name}: {type(e).__name__}: {e}")
+            self.finish('error')
+        finally:
+            await self.close()
+
+        return self.result
+
+    async def _first(self, *events):
+        waiters = [asyncio.ensure_future(event.wait()) for event in events]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+
+    async def _wait_for_media(self, pcm):
+        await self._first(self.media_ready, self.finished)
+        if self.finished.is_set():
+            return
+
+        if pcm is not None:
+            self.track.play(pcm)
+            if self.hangup_after_playback:
+                await self._first(self.track.idle, self.finished)
+                self.finish('playback_done')
+        await self.finished.wait()
+
+    async def close(self):
+        if self.sio.connected:
+            try:
+                await self.sio.emit('leave_call', {})
+                await self.sio.disconnect()
+            except Exception:
+                pass
+        if self.sink is not None:
+            try:
+                await self.sink.stop()
+            except Exception as e:
+                print(f"{self.name}: error closing recording: {e}")
+        if self.pc is not None:
+            try:
+                await self.pc.close()
+            except Exception as e:
+                print(f"{self.name}: error closing peer connection: {e}")
+
+    def create_peer_connection(self):
+        config = RTCConfiguration(iceServers=[RTCIceServer(urls=url) for url in self.ice_servers])
+        self.pc = RTCPeerConnection(configuration=config)
+        self.track = AudioQueueTrack()
+        self.pc.addTrack(self.track)
+
+        # Incoming audio must be consumed either way, or frames pile up
+        self.sink = MediaRecorder(self.record_path) if self.record_path else MediaBlackhole()
+
+        @self.pc.on('track')
+        async def on_track(track):
+            if track.kind == 'audio':
+                self.sink.addTrack(track)
+                await self.sink.start()
+
+        @self.pc.on('connectionstatechange')
         async def on_connectionstatechange():
-            print(f"Connection state is {pc.connectionState}")
-            if peer_connection.connectionState == "connected":
-                print("WebRTC connection established successfully")
-
-        offer = await peer_connection.createOffer()
-        await peer_connection.setLocalDescription(offer)
-        await signaling.send(peer_connection.localDescription)
-
-        while True:
-            obj = await signaling.receive()
-            if isinstance(obj, RTCSessionDescription):
-                await peer_connection.setRemoteDescription(obj)
-                print("Remote description set")
-            elif obj is None:
-                print("Signaling ended")
-                break
-        print("Closing connection")
-    finally:
-        await peer_connection.close()
-
-    
-
-# Run the script
-async def main():
-    # await sio.connect("http://your-signaling-server.com")  # Replace with your signaling server URL
-    # await sio.wait()
-
-    # Connect to the Socket.IO server
-    try:
-        server_url = "http://localhost:5000"  # Replace with your server's URL
-        await sio.connect(server_url)
-        print("Connection established with the server.")
-
-        # Emit a custom event to the server
-
-        print("emitting join call")
-        await sio.emit('join_call', {})
-
-        # print(sio.__dict__)
-        print("event was emitted, waiting for an event")
-
-        # Keep the client running to listen for messages
-        event = await sio.wait()
-        
-        print(f'received event: "{event[0]}" with arguments {event[1:]}')
-
-        print()
-
-
+            state = self.pc.connectionState
+            if state == 'connected' and not self.media_ready.is_set():
+                self.result['media'] = self._elapsed()
+                self.media_ready.set()
+            elif state in ('failed', 'closed'):
+                self.finish(f"connection_{state}")
+
+    async def send_description(self):
+        # aiortc gathers all candidates up front, they are in the SDP
+        await self.sio.emit('webrtc_signal', {
+            'signal': {'type': self.pc.localDescription.type, 'sdp': self.pc.localDescription.sdp}
+        })
+
+    async def on_waiting(self, data):
+        self.result['waiting'] = self._elapsed()
+
+    async def on_call_connected(self, data):
+        self.result['connected'] = self._elapsed()
+        self.result['room'] = data.get('room')
+        async with self.signal_lock:
+            try:
+                if self.pc is None:
+                    self.create_peer_connection()
+
+                if data.get('is_initiator'):
+                    await self.pc.setLocalDescription(await self.pc.createOffer())
+                    await self.send_description()
+            except Exception as e:
+                # Handler errors never reach run(), end the call from here
+                print(f"{self.name}: error setting up the call: {type(e).__name__}: {e}")
+                self.finish('error')
+
+    async def on_webrtc_signal(self, data):
+        signal = data.get('signal') or {}
+        async with self.signal_lock:
+            if self.pc is None:
+                self.create_peer_connection()
+            await self.apply_signal(signal)
+
+    async def apply_signal(self, signal):
+        try:
+            if signal.get('type') == 'offer':
+                await self.pc.setRemoteDescription(RTCSessionDescription(signal['sdp'], 'offer'))
+                await self.pc.setLocalDescription(await self.pc.createAnswer())
+                await self.send_description()
+            elif signal.get('type') == 'answer':
+                await self.pc.setRemoteDescription(RTCSessionDescription(signal['sdp'], 'answer'))
+            elif signal.get('type') == 'candidate' and signal.get('candidate'):
+                candidate = parse_candidate(signal['candidate'])
+                if candidate is not None:
+                    await self.pc.addIceCandidate(candidate)
+        except Exception as e:
+            print(f"{self.name}: WebRTC signal error: {e}")
+
+    async def on_peer_left(self, data):
+        self.finish('peer_left')
+
+    async def on_join_timeout(self, data):
+        self.finish('join_timeout')
+
+    async def on_disconnect(self, *args):
+        self.finish('disconnected')
 
 
+async def main():
+    parser = argparse.ArgumentParser(description="Headless WebRTC robocaller")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--audio', help='audio file to play into the call')
+    parser.add_argument('--text', help='text to speak into the call with the TTS engine')
+    parser.add_argument('--record', help='file to record the other side to, e.g. incoming.wav')
+    parser.add_argument('--scenario', help='only pair with callers using the same scenario tag')
+    parser.add_argument('--role', help='what this caller is, e.g. bot')
+    parser.add_argument('--peer-role', help='what this caller must be paired with, e.g. victim')
+    parser.add_argument('--stay', action='store_true', help="don't hang up when playback ends")
+    parser.add_argument('--max-duration', type=float, default=MAX_CALL_SECONDS)
+    args = parser.parse_args()
+
+    join_data = {key: value for key, value in
+                 (('scenario', args.scenario), ('role', args.role), ('peer_role', args.peer_role)) if value}
+    bot = BotSession(args.url, audio=args.audio, text=args.text, record_path=args.record, join_data=join_data,
+                     hangup_after_playback=not args.stay, max_duration=args.max_duration)
+    print(await bot.run())
 
-    except socketio.exceptions.ConnectionError as e:
-        print(f"Failed to connect to the server: {e}")
 
 if __name__ == "__main__":
     asyncio.run(main())
-
-
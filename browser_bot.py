@@ -1,76 +1,199 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
+import argparse
+import contextlib
 import time
-import torch
-from gtts import gTTS
 import os
+from concurrent.futures import ThreadPoolExecutor
 
+from tts_engines import get_engine
+from audio_transcode import transcode
+from tts_artifacts import ArtifactStore
+from browser_pool import BrowserPool
+from pulse_pool import PulseDevicePool
 
+SERVER_URL = "http://localhost:5000"
+CALL_SECONDS = 65  # safety net: calls still running after this are hung up
+CONNECT_TIMEOUT = 30  # seconds to wait for a peer before giving up on a call
+WAIT_SLICE = 1.0  # longest a tab holds its browser while waiting for an event
 
-def start_browser_with_audio(file_path):
-    # Set up WebDriver with fake audio
-    options = Options()
-    options.add_argument("--use-fake-ui-for-media-stream")  # Auto-allow mic/cam
-    # options.add_argument(f"--use-file-for-fake-audio-capture={file_path}")  # Fake audio input
+# TTS engine (gtts, espeak or tone), set with the TTS_ENGINE environment variable
+tts_engine = get_engine()
 
-    # service = Service()  # Replace with the path to your ChromeDriver
-    driver = webdriver.Chrome(options=options)
-    return driver
+# Per-run audio files, shared with the server on this host
+artifacts = ArtifactStore()
 
-audio_file_1 = 'pokemon.wav'
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio_reinject.js")) as f:
+    AUDIO_REINJECT_JS = f.read()
 
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "call_events.js")) as f:
+    CALL_EVENTS_JS = f.read()
 
-def create_text_to_speech_file(text, output_file):
-    # Create a gTTS object
-    tts = gTTS(text=text, lang="en")
-    # Save the audio file
-    tts.save(output_file)
+WAIT_FOR_EVENT_JS = "window.__waitForCallEvent(arguments[0], arguments[1], arguments[2], arguments[3]);"
 
-    return output_file
 
-def transcode_tts_to_webrtc_compatible_wav(input_file):
+def create_text_to_speech(text):
+    # Synthesize with the configured engine
+    return tts_engine.synthesize(text, lang="en")
 
-    output_file = input_file.replace(".mp3", ".wav")
-
-    ffmpeg_command = "ffmpeg -i {} -ar 16000 -ac 1 -c:a pcm_s16le {}".format(input_file, output_file)
-
-    # Convert the MP3 file to WAV format, blocking until complete
-    os.system(ffmpeg_command)
-
-
-    return output_file
+def transcode_tts_to_webrtc_compatible_wav(audio):
+    # Convert to 16 kHz mono 16-bit WAV in memory
+    return transcode(audio, "wav", rate=16000, channels=1, sample_fmt="s16")
 
 opening = "Hello, this is a robocall, we are going to scam you. The quick brown fox jumped over the lazy dog"
 
 
-tts_file = create_text_to_speech_file(opening, "static/temp_tts.mp3")
-
-wav_file = transcode_tts_to_webrtc_compatible_wav(tts_file)
-
-driver = start_browser_with_audio(audio_file_1)
-
-# Open WebRTC client
-driver.get("http://localhost:5000")
-
-# execute audio_injector script file audio_injector.js
-driver.execute_script(open("audio_reinject.js").read(), wav_file)
-time.sleep(1)
-
-# Automate interactions
-# Example: Click a "Start" button on the page
-start_button = driver.find_element(By.ID, "startCallButton")
-start_button.click()
-
-
-
-
-# driver.execute_script
-
-# Wait for the interaction
-
-time.sleep(65)
-
-# Close the browser
-driver.quit()
+def wait_for_event(tab, names, since=0, timeout=CALL_SECONDS):
+    """
+    Wait for one of the named call events recorded by call_events.js, at or
+    after index since. Returns the event as a dict, or None on timeout.
+    The wait runs in the page in short slices, so other tabs of the browser
+    get their turn in between.
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        remaining = deadline - time.perf_counter()
+        with tab.driver() as driver:
+            driver.set_script_timeout(WAIT_SLICE + 5)
+            event = driver.execute_async_script(WAIT_FOR_EVENT_JS, list(names), since,
+                                                int(max(0, min(WAIT_SLICE, remaining)) * 1000))
+        if event or remaining <= WAIT_SLICE:
+            return event
+
+def wait_for_player(tab, player, since, timeout):
+    """
+    Wait for audio played into a PulseAudio device to finish, or for the
+    call to end first. Returns the call event, playback_ended when the
+    player is done, or None on timeout.
+    """
+    deadline = time.perf_counter() + timeout
+    while player.is_alive():
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return None
+        event = wait_for_event(tab, ('peer_left', 'disconnect'), since, min(WAIT_SLICE, remaining))
+        if event:
+            return event
+    return {'name': 'playback_ended'}
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+def run_call(pool, server_url, wav_names, call_seconds=CALL_SECONDS, connect_timeout=CONNECT_TIMEOUT, script=()):
+    """
+    Place one call from a pooled tab, playing the artifact wav_names (one
+    name, or a list played back to back), then each line of script in turn,
+    synthesized by the server and queued on the same live call. Returns how
+    the call ended, how long it took, and the injected microphone's setup
+    time in milliseconds (None if the page never asked for the microphone).
+
+    The call is over as soon as everything has played (we hang up), the
+    peer hangs up, or the server gives up on finding a peer; the timeouts
+    only catch calls that never get there.
+
+    If the tab's browser has a PulseAudio device (BrowserPool devices), the
+    audio is played into that instead of being injected into the page, and
+    script isn't spoken.
+    """
+    start = time.perf_counter()
+    if isinstance(wav_names, str):
+        wav_names = [wav_names]
+    with pool.tab() as tab:
+        device = tab.browser.device
+        with tab.driver() as driver:
+            # Open WebRTC client
+            driver.get(server_url)
+
+            # Make the page's microphone play our audio once connected, record
+            # the call's events, then start the call
+            if device is None:
+                driver.execute_script(AUDIO_REINJECT_JS, ["/artifacts/" + name for name in wav_names])
+            driver.execute_script(CALL_EVENTS_JS)
+            driver.find_element(By.ID, "startCallButton").click()
+
+        event = wait_for_event(tab, ('call_connected', 'join_timeout', 'disconnect'), 0, connect_timeout)
+        if event is None:
+            status = 'no_peer'
+        elif event['name'] != 'call_connected':
+            status = event['name']
+        elif device is not None:
+            player = device.play(artifacts.path(name) for name in wav_names)
+            event = wait_for_player(tab, player, event['index'] + 1, call_seconds - (time.perf_counter() - start))
+            status = event['name'] if event else 'timeout'
+        else:
+            lines = list(script)
+            while True:
+                event = wait_for_event(tab, ('playback_ended', 'peer_left', 'disconnect'), event['index'] + 1,
+                                       call_seconds - (time.perf_counter() - start))
+                if event is None or event['name'] != 'playback_ended' or not lines:
+                    break
+                with tab.driver() as driver:
+                    driver.execute_script("window.__robocallAudio.say(arguments[0]);", lines.pop(0))
+            status = event['name'] if event else 'timeout'
+
+        if device is not None:
+            device.stop()
+        with tab.driver() as driver:
+            if status in ('playback_ended', 'timeout'):
+                # Hang up ourselves, the peer sees peer_left
+                driver.execute_script("endCall();")
+            injection = driver.execute_script("return window.__audioInjection || null;")
+
+    return status, time.perf_counter() - start, injection['setupMs'] if injection else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Place robocalls from a pool of headless Chrome tabs")
+    parser.add_argument('--url', default=SERVER_URL)
+    parser.add_argument('--calls', type=int, default=1)
+    parser.add_argument('--browsers', type=int, default=1, help='Chrome instances kept warm')
+    parser.add_argument('--tabs', type=int, default=1, help='tabs per browser, i.e. parallel calls per browser')
+    parser.add_argument('--text', action='append', help='what the robocaller says, repeat for a playlist of segments')
+    parser.add_argument('--say', action='append', default=[],
+                        help='line spoken on the same call after the opening, repeat for a script')
+    parser.add_argument('--call-seconds', type=float, default=CALL_SECONDS)
+    parser.add_argument('--pulse', action='store_true',
+                        help="play the audio into the container's PulseAudio virtual microphones, one per browser "
+                             "(entrypoint.sh AUDIO_DEVICES), instead of injecting it into the page")
+    args = parser.parse_args()
+    if args.pulse and args.say:
+        parser.error("--say needs the injected microphone, it can't be used with --pulse")
+    if args.pulse and args.tabs != 1:
+        parser.error("with --pulse, tabs of a browser would share its microphone, use --tabs 1")
+
+    segments = [transcode_tts_to_webrtc_compatible_wav(create_text_to_speech(text)) for text in args.text or [opening]]
+
+    startup = time.perf_counter()
+    pool = BrowserPool(args.browsers, args.tabs, devices=PulseDevicePool() if args.pulse else None,
+                       server_url=args.url).start()
+    startup = time.perf_counter() - startup
+
+    # The audio files are served by the server under /artifacts/ and removed
+    # again when all calls are over
+    try:
+        with contextlib.ExitStack() as stack:
+            wav_names = [stack.enter_context(artifacts.temporary(audio, ".wav")) for audio in segments]
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.browsers * args.tabs) as executor:
+                call = lambda _: run_call(pool, args.url, wav_names, args.call_seconds, script=args.say)
+                results = list(executor.map(call, range(args.calls)))
+            elapsed = time.perf_counter() - start
+    finally:
+        # Close the browsers
+        pool.close()
+
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    setups = [setup for _, _, setup in results if setup is not None]
+    print(f"browser startup: {startup:.1f} s for {args.browsers} browser(s)")
+    print(f"calls:           {len(results)} in {elapsed:.1f} s")
+    for status, count in sorted(statuses.items()):
+        print(f"  {status}: {count}")
+    if setups:
+        print(f"audio setup:     p50 {percentile(setups, 0.5):.0f} ms, p99 {percentile(setups, 0.99):.0f} ms")
+    print(f"throughput:      {len(results) / elapsed * 60:.1f} calls per minute")
+
+
+if __name__ == "__main__":
+    main()
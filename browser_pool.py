@@ -0,0 +1,235 @@
+import contextlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+# Chrome and chromedriver to use, found by Selenium Manager when unset
+CHROME_BINARY = os.environ.get('CHROME_BINARY')
+CHROMEDRIVER = os.environ.get('CHROMEDRIVER')
+# Extra Chrome flags, e.g. "--no-sandbox --disable-dev-shm-usage" in containers
+CHROME_ARGS = os.environ.get('CHROME_ARGS', '').split()
+
+REPLACE_ATTEMPTS = 3  # tries to start a replacement browser before giving up its slot
+REPLACE_BACKOFF = 2  # seconds before the first retry, doubled after each failure
+ACQUIRE_POLL = 1  # seconds between checks that the pool still has browsers while waiting for a tab
+
+
+def default_options(headless=True, fake_media=True, server_url=None):
+    options = Options()
+    if CHROME_BINARY:
+        options.binary_location = CHROME_BINARY
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--use-fake-ui-for-media-stream")  # Auto-allow mic/cam
+    if fake_media:
+        # Chrome's own test devices, otherwise the real (PulseAudio) microphone is used
+        options.add_argument("--use-fake-device-for-media-stream")
+    options.add_argument("--autoplay-policy=no-user-gesture-required")
+    # Tabs in the background keep full speed, several calls run side by side
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+    options.add_argument("--disable-renderer-backgrounding")
+    if server_url:
+        # Cache Storage, where audio_reinject.js keeps audio across calls, only
+        # exists on secure origins; let a plain http:// server count as one
+        parts = urlsplit(server_url)
+        options.add_argument(f"--unsafely-treat-insecure-origin-as-secure={parts.scheme}://{parts.netloc}")
+    for arg in CHROME_ARGS:
+        options.add_argument(arg)
+    return options
+
+
+class Browser:
+    """
+    One Chrome instance. WebDriver talks to one window at a time, so every
+    command on a tab holds the browser's lock and switches to the tab first.
+    With a device (see pulse_pool.py), Chrome uses it as its microphone and
+    speaker; its tabs share it.
+    """
+
+    def __init__(self, options, device=None):
+        self.device = device
+        service = Service(executable_path=CHROMEDRIVER, env=device.env() if device else None)
+        self.driver = webdriver.Chrome(options=options, service=service)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.retiring = False
+        self.retired_tabs = 0
+
+
+class Tab:
+    """
+    A window of a pooled browser, handed out for one call at a time
+    """
+
+    def __init__(self, browser, handle):
+        self.browser = browser
+        self.handle = handle
+
+    @contextlib.contextmanager
+    def driver(self):
+        """
+        The browser's driver, switched to this tab, for the duration of a with block
+        """
+        with self.browser.lock:
+            self.browser.driver.switch_to.window(self.handle)
+            yield self.browser.driver
+
+
+class BrowserPool:
+    """
+    Warm headless Chrome instances, reused across calls.
+
+    Starts size browsers with tabs_per_browser tabs each, so up to
+    size * tabs_per_browser calls can run in parallel without paying
+    Chrome's startup for every call. A tab is reset when released: it is
+    pointed at about:blank, which drops the page's socket, peer connection
+    and audio graph, and its cookies and storage are cleared. A browser is
+    replaced after max_calls calls, or when resetting one of its tabs fails,
+    to keep leaks and wedged renderers in check. If a replacement can't be
+    started, its slot is dropped and the pool runs with fewer browsers.
+
+    With devices, a PulseDevicePool, every browser leases a virtual
+    microphone of its own for as long as it runs. server_url is the server
+    the tabs call, which Chrome is told to treat as a secure origin.
+    """
+
+    def __init__(self, size=2, tabs_per_browser=4, options=None, max_calls=200, devices=None, server_url=None):
+        self.size = size
+        self.tabs_per_browser = tabs_per_browser
+        self.options = options or default_options(fake_media=devices is None, server_url=server_url)
+        self.max_calls = max_calls
+        self.devices = devices
+        if devices is not None and len(devices) < size:
+            raise ValueError(f"{size} browsers need {size} audio devices, only {len(devices)} available")
+        self.browsers = []
+        self.tabs = queue.Queue()
+
+    def _new_browser(self):
+        device = self.devices.acquire() if self.devices else None
+        try:
+            return Browser(self.options, device)
+        except Exception:
+            if device:
+                self.devices.release(device)
+            raise
+
+    def _quit(self, browser):
+        try:
+            browser.driver.quit()
+        except Exception:
+            pass
+        if browser.device:
+            self.devices.release(browser.device)
+
+    def start(self):
+        # Cold starts run side by side, they are the slow part
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            self.browsers = list(executor.map(lambda _: self._new_browser(), range(self.size)))
+
+        for browser in self.browsers:
+            self._open_tabs(browser)
+        return self
+
+    def _open_tabs(self, browser):
+        driver = browser.driver
+        with browser.lock:
+            handles = [driver.current_window_handle]
+            for _ in range(self.tabs_per_browser - 1):
+                driver.switch_to.new_window('tab')
+                handles.append(driver.current_window_handle)
+        for handle in handles:
+            self.tabs.put(Tab(browser, handle))
+
+    def acquire(self, timeout=None):
+        """
+        Take a free tab, waiting up to timeout seconds (queue.Empty after
+        that). Raises RuntimeError once every browser slot has been dropped.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if not self.browsers:
+                raise RuntimeError("No browsers left in the pool, starting replacements failed")
+            wait = ACQUIRE_POLL if deadline is None else min(ACQUIRE_POLL, deadline - time.monotonic())
+            if wait <= 0:
+                raise queue.Empty
+            try:
+                tab = self.tabs.get(timeout=wait)
+            except queue.Empty:
+                continue
+            if not tab.browser.retiring:
+                return tab
+            # An idle tab of a browser that is being replaced
+            self._retire_tab(tab)
+
+    def release(self, tab):
+        browser = tab.browser
+        try:
+            with tab.driver() as driver:
+                driver.get("about:blank")
+                driver.delete_all_cookies()
+                driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+                browser.calls += 1
+                if browser.calls >= self.max_calls:
+                    browser.retiring = True
+        except Exception as e:
+            print(f"Resetting tab failed, replacing its browser: {e}")
+            browser.retiring = True
+
+        if browser.retiring:
+            self._retire_tab(tab)
+        else:
+            self.tabs.put(tab)
+
+    def _retire_tab(self, tab):
+        # The browser is replaced once all its tabs are back, calls in its other tabs run to the end
+        browser = tab.browser
+        with browser.lock:
+            browser.retired_tabs += 1
+            if browser.retired_tabs < self.tabs_per_browser:
+                return
+
+        self._quit(browser)
+        # Never raises: this runs from release(), at the end of someone's call
+        delay = REPLACE_BACKOFF
+        for attempt in range(1, REPLACE_ATTEMPTS + 1):
+            replacement = None
+            try:
+                replacement = self._new_browser()
+                self._open_tabs(replacement)
+            except Exception as e:
+                print(f"Starting a replacement browser failed (attempt {attempt} of {REPLACE_ATTEMPTS}): {e}")
+                if replacement is not None:
+                    self._quit(replacement)
+            else:
+                self.browsers = [replacement if b is browser else b for b in self.browsers]
+                return
+            if attempt < REPLACE_ATTEMPTS:
+                time.sleep(delay)
+                delay *= 2
+
+        self.browsers = [b for b in self.browsers if b is not browser]
+        print(f"Dropped a browser slot, the pool now has {len(self.browsers)} browser(s)")
+
+    @contextlib.contextmanager
+    def tab(self, timeout=None):
+        """
+        Borrow a tab for a with block
+        """
+        tab = self.acquire(timeout)
+        try:
+            yield tab
+        finally:
+            self.release(tab)
+
+    def close(self):
+        for browser in self.browsers:
+            self._quit(browser)
+        self.browsers = []
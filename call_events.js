@@ -0,0 +1,61 @@
+// Records the call page's lifecycle events for the bot harness.
+//
+// Injected after the page loads. Socket.IO call events, and the end of the
+// injected audio (a 'robocall:playback_ended' window event from
+// audio_reinject.js), are appended to window.__callEvents. The harness
+// waits for them with execute_async_script through __waitForCallEvent,
+// which answers as soon as a matching event is recorded, or with null
+// after timeoutMs.
+
+(function () {
+    if (window.__callEvents) {
+        return;
+    }
+
+    const events = window.__callEvents = [];
+    const waiters = [];
+
+    function record(name, data) {
+        events.push({ name: name, data: data === undefined ? null : data, at: performance.now() });
+        waiters.slice().forEach((waiter) => waiter());
+    }
+
+    ['waiting_for_peer', 'call_connected', 'peer_left', 'join_timeout', 'disconnect'].forEach((name) => {
+        socket.on(name, (data) => record(name, data));
+    });
+    window.addEventListener('robocall:playback_ended', () => record('playback_ended'));
+
+    // First event named in names at or after index from, as {index, name, data, at}
+    window.__waitForCallEvent = function (names, from, timeoutMs, done) {
+        function find() {
+            for (let i = from; i < events.length; i++) {
+                if (names.includes(events[i].name)) {
+                    return Object.assign({ index: i }, events[i]);
+                }
+            }
+            return null;
+        }
+
+        const found = find();
+        if (found || timeoutMs <= 0) {
+            done(found);
+            return;
+        }
+
+        let timer = null;
+        function finish(result) {
+            clearTimeout(timer);
+            waiters.splice(waiters.indexOf(waiter), 1);
+            done(result);
+        }
+        function waiter() {
+            const event = find();
+            if (event) {
+                finish(event);
+            }
+        }
+
+        waiters.push(waiter);
+        timer = setTimeout(() => finish(null), timeoutMs);
+    };
+})();
@@ -0,0 +1,137 @@
+import collections
+import threading
+import time
+
+
+class CallRegistry:
+    """
+    Two-way index of active calls.
+
+    rooms maps room -> participants ({'caller1': sid, 'caller2': sid, ...})
+    and sid_rooms maps every participant sid -> room, so finding the room
+    or the other participant of a sender is a dict lookup instead of a walk
+    over all calls.
+
+    Rooms are also kept ordered by last activity, so expiring idle calls only
+    looks at the calls that are actually stale.
+    """
+
+    def __init__(self):
+        self.rooms = {}
+        self.sid_rooms = {}
+        self.last_active = collections.OrderedDict()  # room -> timestamp, oldest first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def __contains__(self, room):
+        return room in self.rooms
+
+    def sid_count(self):
+        return len(self.sid_rooms)
+
+    def add_call(self, room, caller1, caller2, **extra):
+        """
+        Register a call between two sids, returning its participants dict
+        """
+        participants = {'caller1': caller1, 'caller2': caller2}
+        participants.update(extra)
+
+        with self._lock:
+            self.rooms[room] = participants
+            self.sid_rooms[caller1] = room
+            self.sid_rooms[caller2] = room
+            self.last_active[room] = time.time()
+
+        return participants
+
+    def get(self, room):
+        return self.rooms.get(room)
+
+    def room_of(self, sid):
+        return self.sid_rooms.get(sid)
+
+    def peer_of(self, sid):
+        """
+        Return the other participant of the call sid is in, or None
+        """
+        room = self.sid_rooms.get(sid)
+        if room is None:
+            return None
+
+        participants = self.rooms.get(room)
+        if participants is None:
+            return None
+
+        if participants['caller1'] == sid:
+            return participants['caller2']
+        return participants['caller1']
+
+    def touch(self, sid):
+        """
+        Mark the call sid is in as active now
+        """
+        room = self.sid_rooms.get(sid)
+        if room is None:
+            return
+
+        with self._lock:
+            if room in self.last_active:
+                self.last_active[room] = time.time()
+                self.last_active.move_to_end(room)
+
+    def expire_idle(self, ttl, now=None):
+        """
+        Drop every call with no activity in the last ttl seconds.
+
+        Returns a list of (room, participants) for the calls that were dropped.
+        """
+        cutoff = (now or time.time()) - ttl
+        expired = []
+
+        while True:
+            with self._lock:
+                if not self.last_active:
+                    break
+                room, last_active = next(iter(self.last_active.items()))
+                if last_active > cutoff:
+                    break
+
+            participants = self.remove_call(room)
+            if participants is not None:
+                expired.append((room, participants))
+
+        return expired
+
+    def remove_call(self, room):
+        """
+        Drop a call and both of its sid entries, returning its participants
+        """
+        with self._lock:
+            self.last_active.pop(room, None)
+            participants = self.rooms.pop(room, None)
+            if participants is None:
+                return None
+
+            for key in ('caller1', 'caller2'):
+                if self.sid_rooms.get(participants[key]) == room:
+                    del self.sid_rooms[participants[key]]
+
+        return participants
+
+    def remove_sid(self, sid):
+        """
+        Drop the call sid is in (on leave or disconnect).
+
+        Returns (room, participants), or (None, None) if sid was not in a call.
+        """
+        room = self.sid_rooms.get(sid)
+        if room is None:
+            return None, None
+
+        participants = self.remove_call(room)
+        if participants is None:
+            return None, None
+
+        return room, participants
@@ -0,0 +1,5 @@
+#!/bin/sh
+# Headless Chrome image: virtual microphones only, no X server, VNC or Selenium server
+. /opt/bin/pulse_setup.sh
+
+exec "$@"
@@ -0,0 +1,138 @@
+import collections
+import itertools
+import threading
+import time
+
+# A caller waiting for a peer. role is what the caller is ('bot', 'victim', ...),
+# peer_role is what it must be paired with and scenario is a free-form tag that
+# only callers with the same tag are paired on. None means no constraint.
+WaitingCaller = collections.namedtuple(
+    'WaitingCaller', ['sid', 'role', 'peer_role', 'scenario', 'joined_at', 'seq']
+)
+
+
+def is_compatible(first, second):
+    """
+    Check whether two waiting callers may be paired with each other
+    """
+    if first.scenario != second.scenario:
+        return False
+    if first.peer_role is not None and first.peer_role != second.role:
+        return False
+    if second.peer_role is not None and second.peer_role != first.role:
+        return False
+    return True
+
+
+def pair_callers(callers, max_pairs=None):
+    """
+    Pair waiting callers, given oldest first.
+
+    Each caller is paired with the longest-waiting compatible caller that
+    came before it. Returns a list of (first, second) pairs where first
+    joined earlier; callers that cannot be paired are left out.
+    """
+    pairs = []
+
+    # Unpaired callers seen so far, grouped by their constraints. Every
+    # caller in a group is interchangeable, so only the head of each group
+    # has to be checked.
+    unpaired = {}
+
+    for caller in callers:
+        if max_pairs is not None and len(pairs) >= max_pairs:
+            break
+
+        best = None
+        for group in unpaired.values():
+            if group and is_compatible(group[0], caller):
+                if best is None or group[0].seq < best[0].seq:
+                    best = group
+
+        if best is None:
+            key = (caller.scenario, caller.role, caller.peer_role)
+            unpaired.setdefault(key, collections.deque()).append(caller)
+            continue
+
+        pairs.append((best.popleft(), caller))
+
+    return pairs
+
+
+class MatchQueue:
+    """
+    FIFO matchmaking queue that pairs waiting callers in batches.
+
+    Callers are enqueued by join_call and paired by drain(), which is meant to
+    be called from a single matchmaker loop once per tick. Every mutation holds
+    a lock that is never held across I/O, so it is safe both under threading
+    and under eventlet (where the lock is simply never contended).
+    """
+
+    def __init__(self):
+        self._waiting = collections.OrderedDict()  # sid -> WaitingCaller, in join order
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def __contains__(self, sid):
+        return sid in self._waiting
+
+    def enqueue(self, sid, role=None, peer_role=None, scenario=None):
+        """
+        Add a caller to the back of the queue.
+
+        Returns False if the caller was already waiting.
+        """
+        with self._lock:
+            if sid in self._waiting:
+                return False
+            self._waiting[sid] = WaitingCaller(
+                sid, role, peer_role, scenario, time.time(), next(self._seq)
+            )
+        return True
+
+    def remove(self, sid):
+        """
+        Take a caller out of the queue, returning whether it was waiting
+        """
+        with self._lock:
+            return self._waiting.pop(sid, None) is not None
+
+    def expire(self, ttl, now=None):
+        """
+        Drop callers that have been waiting for more than ttl seconds.
+
+        Returns the WaitingCaller entries that were dropped.
+        """
+        cutoff = (now or time.time()) - ttl
+        expired = []
+
+        with self._lock:
+            # The queue is in join order, so stale callers are all at the front
+            while self._waiting:
+                caller = next(iter(self._waiting.values()))
+                if caller.joined_at > cutoff:
+                    break
+                del self._waiting[caller.sid]
+                expired.append(caller)
+
+        return expired
+
+    def drain(self, max_pairs=None):
+        """
+        Pair as many waiting callers as possible, oldest first.
+
+        Returns a list of (first, second) WaitingCaller pairs, see
+        pair_callers, and removes them from the queue. Callers that cannot
+        be paired yet keep their place.
+        """
+        with self._lock:
+            pairs = pair_callers(self._waiting.values(), max_pairs)
+            for first, second in pairs:
+                del self._waiting[first.sid]
+                del self._waiting[second.sid]
+
+        return pairs
@@ -0,0 +1,107 @@
+import contextlib
+import os
+import queue
+import re
+import subprocess
+import threading
+
+# Devices created by entrypoint.sh: MicOutput/VirtualMic, MicOutput1/VirtualMic1, ...
+SINK_PATTERN = re.compile(r'^MicOutput(\d*)$')
+
+
+class AudioDevice:
+    """
+    One virtual microphone: audio played into sink comes out of source
+    """
+
+    def __init__(self, sink, source):
+        self.sink = sink
+        self.source = source
+        self.process = None
+
+    def env(self, base=None):
+        """
+        Environment for a process that should use this device as its
+        default microphone and speaker
+        """
+        env = dict(os.environ if base is None else base)
+        env['PULSE_SOURCE'] = self.source
+        env['PULSE_SINK'] = self.sink
+        return env
+
+    def play(self, paths):
+        """
+        Play the files into the sink one after another, in the background.
+        Returns the thread doing it, which ends when playback is over.
+        """
+        thread = threading.Thread(target=self._play, args=(list(paths),), daemon=True)
+        thread.start()
+        return thread
+
+    def _play(self, paths):
+        for path in paths:
+            self.process = subprocess.Popen(['paplay', '--device=' + self.sink, path])
+            if self.process.wait() != 0:
+                break
+        self.process = None
+
+    def stop(self):
+        process = self.process
+        if process is not None:
+            process.terminate()
+
+
+def discover():
+    """
+    The virtual microphones of the running PulseAudio server
+    """
+    output = subprocess.run(['pactl', 'list', 'short', 'sinks'],
+                            capture_output=True, text=True, check=True).stdout
+    devices = []
+    for line in output.splitlines():
+        fields = line.split('\t')
+        match = SINK_PATTERN.match(fields[1]) if len(fields) > 1 else None
+        if match:
+            devices.append((int(match.group(1) or 0), AudioDevice(fields[1], 'VirtualMic' + match.group(1))))
+    return [device for _, device in sorted(devices, key=lambda item: item[0])]
+
+
+class PulseDevicePool:
+    """
+    Leases the container's virtual microphones to bot sessions, one session
+    per device, so parallel calls don't hear each other's audio
+    """
+
+    def __init__(self, devices=None):
+        self.devices = discover() if devices is None else devices
+        if not self.devices:
+            raise RuntimeError("No virtual microphones found, is AUDIO_DEVICES set for entrypoint.sh?")
+        self.free = queue.Queue()
+        for device in self.devices:
+            self.free.put(device)
+
+    def __len__(self):
+        return len(self.devices)
+
+    def acquire(self, timeout=None):
+        return self.free.get(timeout=timeout)
+
+    def release(self, device):
+        device.stop()
+        self.free.put(device)
+
+    @contextlib.contextmanager
+    def lease(self, timeout=None):
+        """
+        Borrow a device for a with block
+        """
+        device = self.acquire(timeout)
+        try:
+            yield device
+        finally:
+            self.release(device)
+
+
+if __name__ == '__main__':
+    for device in discover():
+        print(f"{device.sink} -> {device.source}")
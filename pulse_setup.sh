@@ -0,0 +1,22 @@
+# Start PulseAudio with virtual devices, shared by entrypoint.sh and entrypoint-headless.sh
+
+# Load pulseaudio virtual audio source
+pulseaudio -D --exit-idle-time=-1
+
+# Create virtual output device (used for audio playback)
+pactl load-module module-null-sink sink_name=DummyOutput sink_properties=device.description="Virtual_Dummy_Output"
+
+# Create virtual microphone outputs, used to play media into the "microphones".
+# AUDIO_DEVICES pairs are created so parallel calls each get their own
+# (MicOutput/VirtualMic, MicOutput1/VirtualMic1, ...), pulse_pool.py leases them out
+AUDIO_DEVICES=${AUDIO_DEVICES:-1}
+for i in $(seq 0 $((AUDIO_DEVICES - 1))); do
+    suffix=$([ "$i" -eq 0 ] || echo "$i")
+    pactl load-module module-null-sink sink_name=MicOutput$suffix sink_properties=device.description="Virtual_Microphone_Output$suffix"
+
+    # Create a virtual audio source linked up to the virtual microphone output
+    pacmd load-module module-virtual-source source_name=VirtualMic$suffix master=MicOutput$suffix.monitor
+done
+
+# Set the default source device (for future sources) to use the monitor of the first virtual microphone output
+pacmd set-default-source MicOutput.monitor
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+import uuid
+
+from wav_recorder import WavRecorder
+
+
+class RecordingSession:
+    """
+    One capture: which device it reads, where it writes, and its state
+    """
+
+    def __init__(self, recording_id, path, device=None, label=None):
+        self.id = recording_id
+        self.path = path
+        self.device = device
+        self.label = label
+        self.started_at = time.time()
+        self.stopped_at = None
+        self.segments = []
+        self.frames = 0
+        self.error = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def active(self):
+        return self.stopped_at is None
+
+    def info(self, rate):
+        return {
+            'id': self.id,
+            'label': self.label,
+            'device': self.device,
+            'active': self.active,
+            'started_at': self.started_at,
+            'stopped_at': self.stopped_at,
+            'duration': self.frames / rate,
+            'segments': len(self.segments),
+            'error': self.error
+        }
+
+
+class RecordingManager:
+    """
+    Runs any number of recordings at once, each with its own id.
+
+    Every recording reads its own input stream on its own thread and writes
+    through a WavRecorder to <id>.wav (or <id>-NNN.wav segments) under root.
+    One input device can only feed one active recording. The label is free
+    text, e.g. the call room a recording belongs to.
+
+    Retention: sweep() deletes finished recordings older than max_age
+    seconds, then the oldest finished ones until the directory is under
+    max_bytes. Files left by earlier runs count too, active recordings are
+    never touched.
+    """
+
+    def __init__(self, root, open_stream, channels, sample_width, rate, chunk,
+                 segment_seconds=None, max_age=24 * 3600, max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.open_stream = open_stream
+        self.channels = channels
+        self.sample_width = sample_width
+        self.rate = rate
+        self.chunk = chunk
+        self.segment_seconds = segment_seconds
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+        os.makedirs(root, exist_ok=True)
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def start(self, device=None, label=None):
+        """
+        Start recording from device (None for the default input), returning the session
+        """
+        with self._lock:
+            for session in self.sessions.values():
+                if session.active and session.device == device:
+                    raise ValueError(f"Device {device} is already being recorded by {session.id}")
+
+            recording_id = uuid.uuid4().hex[:12]
+            session = RecordingSession(recording_id, os.path.join(self.root, recording_id + '.wav'), device, label)
+            self.sessions[recording_id] = session
+
+        session.thread = threading.Thread(target=self._record, args=(session,), daemon=True)
+        session.thread.start()
+        return session
+
+    def _record(self, session):
+        stream = None
+        recorder = None
+        try:
+            stream = self.open_stream(session.device)
+            recorder = WavRecorder(session.path, self.channels, self.sample_width, self.rate, self.segment_seconds)
+            while not session.stop_event.is_set():
+                recorder.write(stream.read(self.chunk))
+                session.frames = recorder.frames
+        except Exception as e:
+            print(f"Recording {session.id} error: {e}")
+            session.error = str(e)
+        finally:
+            if recorder is not None:
+                session.segments = recorder.close()
+            if stream is not None:
+                stream.stop_stream()
+                stream.close()
+            session.stopped_at = time.time()
+
+    def stop(self, recording_id):
+        """
+        Stop a recording and wait until its files are complete
+        """
+        session = self.get(recording_id)
+        if session is None:
+            return None
+        session.stop_event.set()
+        if session.thread is not None:
+            session.thread.join()
+        return session
+
+    def get(self, recording_id):
+        with self._lock:
+            return self.sessions.get(recording_id)
+
+    def latest(self):
+        """
+        The most recently started recording that has finished
+        """
+        with self._lock:
+            finished = [session for session in self.sessions.values() if not session.active]
+        return max(finished, key=lambda session: session.started_at, default=None)
+
+    def list(self):
+        with self._lock:
+            sessions = list(self.sessions.values())
+        return [session.info(self.rate) for session in sorted(sessions, key=lambda session: session.started_at)]
+
+    def sweep(self, now=None):
+        """
+        Apply the retention policy, returning how many files were removed
+        """
+        now = now or time.time()
+        with self._lock:
+            active = {session.id for session in self.sessions.values() if session.active}
+
+        files = []
+        for name in os.listdir(self.root):
+            # <id>.wav or <id>-NNN.wav
+            recording_id = name.split('.')[0].split('-')[0]
+            if recording_id in active:
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path, recording_id))
+
+        files.sort()
+        total = sum(size for _, size, _, _ in files)
+        removed = 0
+        gone = set()
+        for mtime, size, path, recording_id in files:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            gone.add(recording_id)
+
+        # Forget finished sessions whose files are all gone
+        with self._lock:
+            for recording_id in gone:
+                session = self.sessions.get(recording_id)
+                if session is not None and not session.active and not any(os.path.exists(p) for p in session.segments):
+                    del self.sessions[recording_id]
+
+        return removed
@@ -0,0 +1,278 @@
+"""
+Pluggable call state for the signaling server.
+
+The backend is picked from a URL:
+
+    memory://                  call state lives in this process (default)
+    redis://host:port/db       call state lives in Redis, shared by every
+                               worker process, and Flask-SocketIO relays
+                               emits between workers through the same Redis
+
+The Redis classes only use plain Redis commands (no Lua, no modules), so they
+work against anything that speaks the Redis protocol, including a local
+stand-in such as fakeredis: pass a client built with decode_responses=True.
+"""
+import time
+import uuid
+from urllib.parse import urlparse
+
+from call_registry import CallRegistry
+from matchmaking import MatchQueue, WaitingCaller, pair_callers
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+KEY_PREFIX = 'robocall:'
+TOUCH_INTERVAL = 10  # seconds; a worker refreshes a call's activity at most this often
+MATCH_LOCK_TTL = 5000  # milliseconds a matchmaker may hold the queue before it is released
+MATCH_WINDOW = 10000  # waiting callers a single drain looks at
+
+
+class RedisCallRegistry:
+    """
+    CallRegistry with its state kept in Redis.
+
+    Keys:
+        room:<room>   hash with caller1 and caller2
+        sid:<sid>     hash with the room and peer of a participant
+        activity      sorted set of rooms scored by last activity
+    """
+
+    def __init__(self, client, prefix=KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self._activity_key = prefix + 'activity'
+        self._touched = set()
+        self._touched_since = time.time()
+
+    def _room_key(self, room):
+        return f"{self.prefix}room:{room}"
+
+    def _sid_key(self, sid):
+        return f"{self.prefix}sid:{sid}"
+
+    def __len__(self):
+        return self.client.zcard(self._activity_key)
+
+    def __contains__(self, room):
+        return self.client.exists(self._room_key(room)) > 0
+
+    def sid_count(self):
+        # Every call indexes exactly two sids
+        return 2 * len(self)
+
+    def add_call(self, room, caller1, caller2, **extra):
+        participants = {'caller1': caller1, 'caller2': caller2}
+        participants.update(extra)
+
+        pipe = self.client.pipeline()
+        pipe.hset(self._room_key(room), mapping=participants)
+        pipe.hset(self._sid_key(caller1), mapping={'room': room, 'peer': caller2})
+        pipe.hset(self._sid_key(caller2), mapping={'room': room, 'peer': caller1})
+        pipe.zadd(self._activity_key, {room: time.time()})
+        pipe.execute()
+
+        return participants
+
+    def get(self, room):
+        return self.client.hgetall(self._room_key(room)) or None
+
+    def room_of(self, sid):
+        return self.client.hget(self._sid_key(sid), 'room')
+
+    def peer_of(self, sid):
+        return self.client.hget(self._sid_key(sid), 'peer')
+
+    def touch(self, sid):
+        # Signaling comes in bursts, so only refresh each call once per
+        # TOUCH_INTERVAL from this worker instead of on every message
+        now = time.time()
+        if now - self._touched_since > TOUCH_INTERVAL:
+            self._touched.clear()
+            self._touched_since = now
+        if sid in self._touched:
+            return
+        self._touched.add(sid)
+
+        room = self.room_of(sid)
+        if room is not None:
+            self.client.zadd(self._activity_key, {room: now}, xx=True)
+
+    def expire_idle(self, ttl, now=None):
+        cutoff = (now or time.time()) - ttl
+        expired = []
+
+        for room in self.client.zrangebyscore(self._activity_key, '-inf', cutoff):
+            participants = self.remove_call(room)
+            if participants is not None:
+                expired.append((room, participants))
+
+        return expired
+
+    def remove_call(self, room):
+        participants = self.get(room)
+        if participants is None:
+            self.client.zrem(self._activity_key, room)
+            return None
+
+        pipe = self.client.pipeline()
+        pipe.delete(self._room_key(room))
+        pipe.delete(self._sid_key(participants['caller1']))
+        pipe.delete(self._sid_key(participants['caller2']))
+        pipe.zrem(self._activity_key, room)
+        deleted = pipe.execute()[0]
+
+        # Another worker removed the same call first, let it report it
+        if not deleted:
+            return None
+
+        return participants
+
+    def remove_sid(self, sid):
+        room = self.room_of(sid)
+        if room is None:
+            return None, None
+
+        participants = self.remove_call(room)
+        if participants is None:
+            return None, None
+
+        return room, participants
+
+
+class RedisMatchQueue:
+    """
+    MatchQueue with its state kept in Redis.
+
+    Keys:
+        waiting        sorted set of waiting sids scored by join time
+        waiter:<sid>   hash with the constraints of a waiting sid
+        match_lock     held by the one worker currently draining the queue
+
+    Every worker may call drain(), but only the lock holder pairs callers in
+    a given tick, so no caller can be handed to two workers.
+    """
+
+    def __init__(self, client, prefix=KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self._waiting_key = prefix + 'waiting'
+        self._lock_key = prefix + 'match_lock'
+        self._lock_token = uuid.uuid4().hex
+
+    def _waiter_key(self, sid):
+        return f"{self.prefix}waiter:{sid}"
+
+    def __len__(self):
+        return self.client.zcard(self._waiting_key)
+
+    def __contains__(self, sid):
+        return self.client.zscore(self._waiting_key, sid) is not None
+
+    def enqueue(self, sid, role=None, peer_role=None, scenario=None):
+        # Redis has no None, an empty string stands for "no constraint"
+        constraints = {'role': role, 'peer_role': peer_role, 'scenario': scenario}
+
+        pipe = self.client.pipeline()
+        pipe.zadd(self._waiting_key, {sid: time.time()}, nx=True)
+        pipe.hset(self._waiter_key(sid), mapping={
+            key: value or '' for key, value in constraints.items()
+        })
+        added = pipe.execute()[0]
+
+        return bool(added)
+
+    def remove(self, sid):
+        pipe = self.client.pipeline()
+        pipe.zrem(self._waiting_key, sid)
+        pipe.delete(self._waiter_key(sid))
+        return bool(pipe.execute()[0])
+
+    def _load(self, entries):
+        pipe = self.client.pipeline()
+        for sid, _ in entries:
+            pipe.hgetall(self._waiter_key(sid))
+
+        callers = []
+        for seq, ((sid, joined_at), fields) in enumerate(zip(entries, pipe.execute())):
+            callers.append(WaitingCaller(
+                sid,
+                fields.get('role') or None,
+                fields.get('peer_role') or None,
+                fields.get('scenario') or None,
+                joined_at,
+                seq,
+            ))
+        return callers
+
+    def expire(self, ttl, now=None):
+        cutoff = (now or time.time()) - ttl
+        entries = self.client.zrangebyscore(self._waiting_key, '-inf', cutoff, withscores=True)
+
+        expired = []
+        for caller in self._load(entries):
+            if self.remove(caller.sid):
+                expired.append(caller)
+
+        return expired
+
+    def drain(self, max_pairs=None):
+        if not self.client.set(self._lock_key, self._lock_token, nx=True, px=MATCH_LOCK_TTL):
+            return []
+
+        try:
+            entries = self.client.zrange(self._waiting_key, 0, MATCH_WINDOW - 1, withscores=True)
+            callers = self._load(entries)
+
+            pairs = []
+            for first, second in pair_callers(callers, max_pairs):
+                pipe = self.client.pipeline()
+                pipe.zrem(self._waiting_key, first.sid)
+                pipe.zrem(self._waiting_key, second.sid)
+                removed = pipe.execute()
+
+                # One of them left while we were pairing: put the other one
+                # back in its old place and skip the pair
+                if not all(removed):
+                    for caller, was_removed in zip((first, second), removed):
+                        if was_removed:
+                            self.client.zadd(self._waiting_key, {caller.sid: caller.joined_at})
+                    continue
+
+                self.client.delete(self._waiter_key(first.sid), self._waiter_key(second.sid))
+                pairs.append((first, second))
+
+            return pairs
+        finally:
+            if self.client.get(self._lock_key) == self._lock_token:
+                self.client.delete(self._lock_key)
+
+
+def create_call_state(url='memory://'):
+    """
+    Build (call_registry, match_queue) for a backend URL
+    """
+    scheme = urlparse(url).scheme
+
+    if scheme == 'memory':
+        return CallRegistry(), MatchQueue()
+
+    if scheme in ('redis', 'rediss', 'unix'):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a Redis signaling backend")
+        client = redis.Redis.from_url(url, decode_responses=True)
+        return RedisCallRegistry(client), RedisMatchQueue(client)
+
+    raise ValueError(f"Unsupported signaling backend: {url}")
+
+
+def message_queue_for(url='memory://'):
+    """
+    Return the Flask-SocketIO message_queue URL for a backend URL, or None
+    when all clients are served by this process
+    """
+    if urlparse(url).scheme == 'memory':
+        return None
+    return url
@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import time
+
+from bot import BotSession, MAX_CALL_SECONDS
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Default script: every bot plays the same line and is paired with any other bot
+DEFAULT_SCRIPT = [{'text': "Hello, this is a robocall. The quick brown fox jumped over the lazy dog."}]
+
+
+def load_script(path):
+    """
+    Per-bot settings: a JSON list of bot specs, bot n uses spec n modulo its length.
+
+    A spec may set audio or text (what the bot says), record (output path,
+    '{name}' is replaced by the bot's name), role, peer_role, scenario,
+    stay (don't hang up after playback) and max_duration.
+    """
+    if not path:
+        return DEFAULT_SCRIPT
+    with open(path) as f:
+        script = json.load(f)
+    if isinstance(script, dict):
+        script = script['bots']
+    if not script:
+        raise ValueError("Swarm script has no bots")
+    return script
+
+
+def make_bot(url, n, spec, ice_servers):
+    name = f"bot-{n}"
+    join_data = {key: spec[key] for key in ('role', 'peer_role', 'scenario') if spec.get(key)}
+    record = spec.get('record')
+    return BotSession(url,
+                      audio=spec.get('audio'),
+                      text=spec.get('text'),
+                      record_path=record.format(name=name) if record else None,
+                      join_data=join_data,
+                      hangup_after_playback=not spec.get('stay'),
+                      max_duration=spec.get('max_duration', MAX_CALL_SECONDS),
+                      ice_servers=ice_servers,
+                      name=name)
+
+
+async def run_bot(url, n, spec, ice_servers):
+    # One bot failing must not take the rest of the shard with it
+    try:
+        return await make_bot(url, n, spec, ice_servers).run()
+    except Exception as e:
+        print(f"bot-{n}: {type(e).__name__}: {e}")
+        return {'name': f"bot-{n}", 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+
+async def run_swarm(url, bot_ids, script, ramp, ice_servers):
+    """
+    Start the given bots at ramp bots per second and wait for all their calls
+    """
+    tasks = []
+    start = time.perf_counter()
+    for i, n in enumerate(bot_ids):
+        # Keep to the ramp schedule rather than sleeping a fixed step, so slow starts don't add up
+        if ramp:
+            delay = start + i / ramp - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(run_bot(url, n, script[n % len(script)], ice_servers)))
+    return await asyncio.gather(*tasks)
+
+
+def raise_fd_limit():
+    # Every bot holds a socket plus ICE/DTLS sockets, the default 1024 runs out fast
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def run_shard(args):
+    """
+    Run one worker's share of the bots in its own event loop
+    """
+    url, bot_ids, script, ramp, ice_servers = args
+    raise_fd_limit()
+    if uvloop is not None:
+        uvloop.install()
+    return asyncio.run(run_swarm(url, bot_ids, script, ramp, ice_servers))
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def summarize(results, elapsed):
+    statuses = {}
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+
+    summary = {'bots': len(results), 'elapsed': elapsed, 'statuses': statuses}
+    for key in ('connected', 'media', 'duration'):
+        samples = [result[key] for result in results if key in result]
+        if samples:
+            summary[key] = {'count': len(samples), 'p50': percentile(samples, 0.5), 'p99': percentile(samples, 0.99)}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a swarm of headless robocallers")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--bots', type=int, default=10)
+    parser.add_argument('--ramp', type=float, default=10, help='bots started per second, 0 starts all at once')
+    parser.add_argument('--script', help='JSON file with per-bot settings (see load_script)')
+    parser.add_argument('--workers', type=int, default=1, help='processes to shard the bots over')
+    parser.add_argument('--stun', action='append', help='STUN/TURN server URL, may be repeated (default: none)')
+    parser.add_argument('--json', help='write per-bot results and the summary to this file')
+    args = parser.parse_args()
+
+    script = load_script(args.script)
+    ice_servers = args.stun or []
+    workers = max(1, min(args.workers, args.bots))
+
+    # Bots are dealt round robin, so every shard gets a mix of the script's entries
+    shards = [(args.url, list(range(worker, args.bots, workers)), script, args.ramp / workers, ice_servers)
+              for worker in range(workers)]
+
+    start = time.perf_counter()
+    if workers == 1:
+        shard_results = [run_shard(shards[0])]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            shard_results = pool.map(run_shard, shards)
+    elapsed = time.perf_counter() - start
+
+    results = [result for shard in shard_results for result in shard]
+    summary = summarize(results, elapsed)
+
+    print(f"bots:      {summary['bots']} in {elapsed:.1f} s on {workers} worker(s)")
+    for status, count in sorted(summary['statuses'].items(), key=lambda item: str(item[0])):
+        print(f"  {status}: {count}")
+    for key in ('connected', 'media', 'duration'):
+        if key in summary:
+            stats = summary[key]
+            print(f"{key + ':':<10} p50 {stats['p50']:.2f} s, p99 {stats['p99']:.2f} s ({stats['count']} bots)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'summary': summary, 'bots': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
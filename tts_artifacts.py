@@ -0,0 +1,94 @@
+import contextlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+
+def default_artifact_dir():
+    """
+    Directory shared by the server and the bots on one host, on tmpfs if possible
+    """
+    base = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, 'robocall-artifacts')
+
+
+class ArtifactStore:
+    """
+    Per-request audio files under unique names.
+
+    Every write gets its own file, so concurrent TTS requests never overwrite
+    each other the way the shared static/temp_tts.* files did. Files are
+    removed when released, and sweep() removes anything older than ttl in
+    case the process that wrote it died first.
+    """
+
+    def __init__(self, root=None, ttl=600):
+        self.root = root or os.environ.get('ARTIFACT_DIR') or default_artifact_dir()
+        self.ttl = ttl
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.live = set()
+
+    def path(self, name):
+        # Names come from URLs, never let one point outside the store
+        if os.path.basename(name) != name or name.startswith('.'):
+            raise ValueError(f"Invalid artifact name: {name}")
+        return os.path.join(self.root, name)
+
+    def write(self, data, suffix=''):
+        """
+        Store data under a new unique name and return the name
+        """
+        name = uuid.uuid4().hex + suffix
+        # Write under a hidden name so readers never see a partial file
+        tmp_path = os.path.join(self.root, '.' + name)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(name))
+
+        with self._lock:
+            self.live.add(name)
+        return name
+
+    def remove(self, name):
+        with self._lock:
+            self.live.discard(name)
+        try:
+            os.remove(self.path(name))
+        except OSError:
+            pass
+
+    @contextlib.contextmanager
+    def temporary(self, data, suffix=''):
+        """
+        Store data for the duration of a with block, yielding its name
+        """
+        name = self.write(data, suffix)
+        try:
+            yield name
+        finally:
+            self.remove(name)
+
+    def sweep(self, now=None):
+        """
+        Remove artifacts older than ttl, returning how many were removed
+        """
+        cutoff = (now or time.time()) - self.ttl
+        removed = 0
+
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+
+            removed += 1
+            with self._lock:
+                self.live.discard(name)
+
+        return removed
@@ -0,0 +1,152 @@
+import collections
+import hashlib
+import os
+import threading
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech.
+
+    Entries are keyed by a hash of (text, lang, voice, format) and kept in two
+    tiers: an in-memory LRU bounded by memory_bytes and, if disk_dir is set,
+    an on-disk LRU bounded by disk_bytes. Hits in the disk tier are promoted
+    back into memory.
+    """
+
+    def __init__(self, memory_bytes=64 * 1024 * 1024, disk_dir=None, disk_bytes=1024 * 1024 * 1024):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+
+        self._memory = collections.OrderedDict()  # key -> audio bytes, least recently used first
+        self._memory_size = 0
+        self._disk = collections.OrderedDict()  # key -> file size, least recently used first
+        self._disk_size = 0
+        self._lock = threading.Lock()
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(text, lang, voice, fmt):
+        payload = '\0'.join((text, lang or '', voice or '', fmt or ''))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def _load_disk_index(self):
+        # Pick up entries from an earlier run, oldest access first
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            path = self._path(name)
+            if len(name) == 64 and os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+
+        self._evict_disk()
+
+    def _remember(self, key, audio):
+        # Caller holds the lock
+        if len(audio) > self.memory_bytes:
+            return
+
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+
+        self._memory[key] = audio
+        self._memory_size += len(audio)
+
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _evict_disk(self):
+        # Caller holds the lock (or is the constructor)
+        while self._disk_size > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, text, lang, voice, fmt):
+        """
+        Return cached audio bytes, or None on a miss
+        """
+        key = self.make_key(text, lang, voice, fmt)
+
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return audio
+
+            if key in self._disk:
+                try:
+                    with open(self._path(key), 'rb') as f:
+                        audio = f.read()
+                    os.utime(self._path(key))
+                except OSError:
+                    self._disk_size -= self._disk.pop(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self._remember(key, audio)
+                    self.hits_disk += 1
+                    return audio
+
+            self.misses += 1
+            return None
+
+    def put(self, text, lang, voice, fmt, audio):
+        key = self.make_key(text, lang, voice, fmt)
+
+        with self._lock:
+            self._remember(key, audio)
+
+            if self.disk_dir and len(audio) <= self.disk_bytes:
+                # Write under a temporary name so readers never see a partial file
+                tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(audio)
+                os.replace(tmp_path, self._path(key))
+
+                self._disk_size -= self._disk.pop(key, 0)
+                self._disk[key] = len(audio)
+                self._disk_size += len(audio)
+                self._evict_disk()
+
+    def get_or_synthesize(self, text, lang, voice, fmt, synthesize):
+        """
+        Return cached audio, calling synthesize() to produce it on a miss
+        """
+        audio = self.get(text, lang, voice, fmt)
+        if audio is None:
+            audio = synthesize()
+            self.put(text, lang, voice, fmt, audio)
+        return audio
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits_memory': self.hits_memory,
+                'hits_disk': self.hits_disk,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_size,
+            }
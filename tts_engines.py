@@ -0,0 +1,163 @@
+"""
+Text-to-speech engines behind one interface.
+
+    gtts    Google Translate TTS, needs network access, returns mp3
+    espeak  local espeak-ng (or espeak) binary, fully offline, returns wav
+    tone    deterministic synthetic tones, no dependencies, returns wav;
+            meant for load tests where the content of the audio is irrelevant
+
+The engine is picked with get_engine(name), which defaults to the TTS_ENGINE
+environment variable.
+"""
+import io
+import math
+import os
+import shutil
+import struct
+import subprocess
+import wave
+
+try:
+    from gtts import gTTS
+except ImportError:
+    gTTS = None
+
+
+class TTSEngine:
+    """
+    Base class for TTS engines.
+
+    format is the container of the bytes returned by synthesize().
+    """
+    name = None
+    format = None
+
+    def synthesize(self, text, lang='en', voice=None):
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    name = 'gtts'
+    format = 'mp3'
+
+    def synthesize(self, text, lang='en', voice=None):
+        if gTTS is None:
+            raise RuntimeError("The gtts package is required for the gtts engine")
+
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class EspeakEngine(TTSEngine):
+    name = 'espeak'
+    format = 'wav'
+
+    def __init__(self):
+        self.binary = shutil.which('espeak-ng') or shutil.which('espeak')
+
+    def synthesize(self, text, lang='en', voice=None):
+        if self.binary is None:
+            raise RuntimeError("espeak-ng or espeak must be installed for the espeak engine")
+
+        # Text goes in on stdin so it can never be parsed as an option
+        result = subprocess.run(
+            [self.binary, '-v', voice or lang, '--stdout'],
+            input=text.encode('utf-8'),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+        return fix_wav_sizes(result.stdout)
+
+
+class ToneEngine(TTSEngine):
+    """
+    Renders every character as a short sine tone.
+
+    The same text always gives the same audio, and the duration grows with
+    the text like speech does, which is all a load test needs.
+    """
+    name = 'tone'
+    format = 'wav'
+
+    RATE = 16000
+    CHAR_SECONDS = 0.06
+
+    def __init__(self):
+        self._tones = {}
+
+    def _tone(self, char):
+        samples = self._tones.get(char)
+        if samples is None:
+            if char.isspace():
+                frequency = 0
+            else:
+                frequency = 200 + (ord(char) % 64) * 12
+            count = int(self.RATE * self.CHAR_SECONDS)
+            samples = struct.pack(f'<{count}h', *(
+                int(8000 * math.sin(2 * math.pi * frequency * n / self.RATE))
+                for n in range(count)
+            ))
+            self._tones[char] = samples
+        return samples
+
+    def synthesize(self, text, lang='en', voice=None):
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.RATE)
+            wf.writeframes(b''.join(self._tone(char) for char in text))
+        return buffer.getvalue()
+
+
+ENGINES = {
+    GTTSEngine.name: GTTSEngine,
+    EspeakEngine.name: EspeakEngine,
+    ToneEngine.name: ToneEngine,
+}
+
+
+def get_engine(name=None):
+    """
+    Create the engine called name, or the one set in TTS_ENGINE (default gtts)
+    """
+    name = name or os.environ.get('TTS_ENGINE', GTTSEngine.name)
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown TTS engine: {name} (choose from {', '.join(ENGINES)})")
+
+
+def fix_wav_sizes(data):
+    """
+    Patch the RIFF and data chunk sizes of wav bytes written to a pipe.
+
+    Tools that stream wav to stdout cannot seek back to fill in the sizes,
+    so they leave placeholders that make the length look wrong to decoders.
+    """
+    data = bytearray(data)
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        return bytes(data)
+
+    struct.pack_into('<I', data, 4, len(data) - 8)
+
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        if chunk_id == b'data':
+            struct.pack_into('<I', data, offset + 4, len(data) - offset - 8)
+            break
+        chunk_size = struct.unpack_from('<I', data, offset + 4)[0]
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+    return bytes(data)
+
+
+def wav_duration(data):
+    """
+    Return the duration in seconds of wav bytes
+    """
+    with wave.open(io.BytesIO(data), 'rb') as wf:
+        return wf.getnframes() / float(wf.getframerate())
@@ -0,0 +1,129 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+POLL_INTERVAL = 0.01  # seconds between checks on a running job
+
+
+class JobPool:
+    """
+    Bounded worker pool for blocking work started from Socket.IO handlers.
+
+    Jobs (TTS synthesis, transcoding) run on a thread or process pool while
+    the handler returns immediately. A green thread / background task per job
+    waits for it with socketio.sleep, so the event loop keeps relaying
+    signaling in the meantime, and then runs the job's callbacks from the
+    event loop and sends a completion event to the requesting sid.
+
+    At most max_pending jobs may be queued or running; submit() refuses more,
+    which is the backpressure handlers pass on to clients. A job that runs
+    past timeout is reported as timed out; its worker slot is only freed once
+    the job really finishes, so a stuck engine can't grow the queue.
+    """
+
+    def __init__(self, socketio, max_workers=4, max_pending=32, timeout=30, use_processes=False):
+        self.socketio = socketio
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        if use_processes:
+            self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.pending = 0
+        self.counters = {'submitted': 0, 'done': 0, 'failed': 0, 'timeout': 0, 'rejected': 0}
+
+    def submit(self, fn, *args, sid=None, on_done=None, on_error=None, event='job_done'):
+        """
+        Run fn(*args) on the pool.
+
+        on_done(result) or on_error(exception) is called from the event loop
+        when the job ends, then event is sent to sid with the job's id, status
+        and timings. Returns the job id, or None if the pool is full.
+        """
+        future = self.try_submit(fn, *args)
+        if future is None:
+            self.reject()
+            return None
+        job_id = next(self._ids)
+
+        self.socketio.start_background_task(
+            self._wait, job_id, future, time.monotonic(), sid, on_done, on_error, event
+        )
+        return job_id
+
+    def try_submit(self, fn, *args):
+        """
+        Run fn(*args) on the pool and return its future, for callers that
+        wait for the result themselves (tts_streaming.synthesize_stream) and
+        so apply their own timeout. Counts against max_pending like submit();
+        returns None if the pool is full, without counting a rejection, so
+        a caller may keep trying until a slot frees up.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                return None
+            self.pending += 1
+            self.counters['submitted'] += 1
+
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def reject(self):
+        """
+        Count a request refused because the pool is full, for handlers that
+        turn clients away without submitting
+        """
+        with self._lock:
+            self.counters['rejected'] += 1
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    def _wait(self, job_id, future, submitted_at, sid, on_done, on_error, event):
+        deadline = submitted_at + self.timeout
+        while not future.done() and time.monotonic() < deadline:
+            self.socketio.sleep(POLL_INTERVAL)
+
+        result = error = None
+        if not future.done():
+            future.cancel()
+            status = 'timeout'
+            error = TimeoutError(f"Job {job_id} took longer than {self.timeout} s")
+        else:
+            try:
+                result = future.result()
+                status = 'done'
+            except Exception as e:
+                status = 'failed'
+                error = e
+
+        try:
+            if status == 'done' and on_done:
+                on_done(result)
+            elif status != 'done' and on_error:
+                on_error(error)
+        except Exception as e:
+            print(f"Job {job_id} callback error: {e}")
+
+        with self._lock:
+            self.counters[status] += 1
+
+        if sid is not None:
+            self.socketio.emit(event, {
+                'job_id': job_id,
+                'status': status,
+                'elapsed_ms': (time.monotonic() - submitted_at) * 1000
+            }, room=sid)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['pending'] = self.pending
+        return stats
@@ -0,0 +1,89 @@
+import os
+import wave
+
+
+class WavRecorder:
+    """
+    Writes PCM chunks straight to WAV files as they are captured.
+
+    Chunks go to disk as they arrive and the header is patched with the
+    real length when a file is closed, so memory use doesn't grow with the
+    length of the recording. With segment_seconds set, a new file is started
+    every segment_seconds of audio: path 'static/output.wav' becomes
+    'static/output-000.wav', 'static/output-001.wav' and so on.
+    """
+
+    def __init__(self, path, channels, sample_width, rate, segment_seconds=None):
+        self.path = path
+        self.channels = channels
+        self.sample_width = sample_width
+        self.rate = rate
+        self.frame_size = channels * sample_width
+        self.segment_frames = int(segment_seconds * rate) if segment_seconds else None
+
+        self.segments = []
+        self.frames = 0
+        self._segment_frames_written = 0
+        self._wav = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._open_segment()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def duration(self):
+        return self.frames / self.rate
+
+    def _segment_path(self, index):
+        if self.segment_frames is None:
+            return self.path
+        base, ext = os.path.splitext(self.path)
+        return f"{base}-{index:03d}{ext}"
+
+    def _open_segment(self):
+        path = self._segment_path(len(self.segments))
+        self._wav = wave.open(path, 'wb')
+        self._wav.setnchannels(self.channels)
+        self._wav.setsampwidth(self.sample_width)
+        self._wav.setframerate(self.rate)
+        self._segment_frames_written = 0
+        self.segments.append(path)
+
+    def write(self, data):
+        """
+        Append PCM data, starting new segments as needed
+        """
+        if self._wav is None:
+            raise ValueError("Recorder is closed")
+
+        while data:
+            if self.segment_frames is None:
+                chunk, data = data, b''
+            else:
+                if self._segment_frames_written >= self.segment_frames:
+                    self._wav.close()
+                    self._open_segment()
+                room = (self.segment_frames - self._segment_frames_written) * self.frame_size
+                chunk, data = data[:room], data[room:]
+
+            # writeframesraw leaves the header alone, close() patches it once
+            self._wav.writeframesraw(chunk)
+            frames = len(chunk) // self.frame_size
+            self._segment_frames_written += frames
+            self.frames += frames
+
+    def close(self):
+        """
+        Patch the header of the open file and close it, returning all segment paths
+        """
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+        return list(self.segments)